@@ -0,0 +1,248 @@
+"""ضبط الدخول لمسارات الكتابة تحت الضغط
+
+عند مشاركة رابط التسجيل تصل الطلبات دفعات، ومعها إرسال مزدوج من نفس
+النموذج. هنا ثلاث طبقات تُركّب كـ decorators:
+
+- rate_limited: حد لكل عميل (دلو رموز في ذاكرة العامل) ورد 429 فوري.
+- idempotent: مفتاح Idempotency-Key يرسله النموذج؛ إعادة نفس الطلب تُرجع
+  الرد المحفوظ بدل تسجيل ثانٍ، والمفاتيح في SQLite مشتركة بين العمال.
+- gated: عدد محدود من الطلبات المتزامنة عبر كل العمال (أقفال ملفات)، وما
+  زاد يُرفض بـ 503 بعد انتظار قصير بدل أن يصطف حتى تنتهي مهلة gunicorn.
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import request, jsonify, make_response
+
+from metrics import metrics
+from storage import file_lock
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_\-]{8,100}$')
+
+
+def _reject(status, message, retry_after):
+    metrics.count('admission_rejected', status=status, endpoint=request.endpoint)
+    response = jsonify({'success': False, 'message': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(int(retry_after + 0.999), 1))
+    return response
+
+
+# ==================== Rate Limiting ====================
+
+class RateLimiter:
+    """دلو رموز لكل عميل: rate طلب في الثانية مع دفعة حتى burst
+
+    العدادات في ذاكرة العامل، فالحد الفعلي عبر gunicorn هو الحد مضروباً في
+    عدد العمال على الأكثر.
+    """
+
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def allow(self, client):
+        """(مسموح؟، ثوانٍ حتى الرمز التالي)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            # القاموس مرتب حسب آخر استعمال، فالأقدم أولاً عند الامتلاء
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                del self._buckets[next(iter(self._buckets))]
+        return allowed, 0 if allowed else (1 - tokens) / self.rate
+
+
+def rate_limited(limiter, message='طلبات كثيرة، يرجى المحاولة بعد قليل'):
+    """Decorator بحد limiter لكل عنوان عميل، أو بلا حد إذا كان limiter هو None"""
+    def decorator(view):
+        if limiter is None:
+            return view
+
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            allowed, retry_after = limiter.allow(request.remote_addr)
+            if not allowed:
+                return _reject(429, message, retry_after)
+            return view(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+# ==================== Concurrency Gate ====================
+
+class ConcurrencyGate:
+    """slots طلب متزامن على الأكثر عبر كل العمليات
+
+    كل مكان ملف قفل path.N؛ الطلب يأخذ أول مكان فارغ دون انتظار، ويعيد
+    المحاولة حتى wait ثانية ثم يستسلم.
+    """
+
+    def __init__(self, path, slots, wait=0.5, poll=0.02):
+        self.paths = [f'{path}.{n}' for n in range(slots)]
+        self.wait = wait
+        self.poll = poll
+
+    @contextmanager
+    def slot(self):
+        """يُرجع True إذا حصلنا على مكان"""
+        deadline = time.monotonic() + self.wait
+        while True:
+            for path in self.paths:
+                with file_lock(path, blocking=False) as acquired:
+                    if acquired:
+                        yield True
+                        return
+            if time.monotonic() >= deadline:
+                yield False
+                return
+            time.sleep(self.poll)
+
+
+def gated(gate, message='الخادم مشغول حالياً، يرجى إعادة المحاولة بعد ثوانٍ'):
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            with gate.slot() as admitted:
+                if not admitted:
+                    return _reject(503, message, gate.wait)
+                return view(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+# ==================== Idempotency ====================
+
+class IdempotencyStore:
+    """الردود المحفوظة حسب مفتاح العميل، لمدة ttl ثانية
+
+    المفتاح يُحجز قبل تنفيذ الطلب (status فارغ)، فإذا وصل نفس المفتاح أثناء
+    التنفيذ يُرد عليه 409. الحجز الذي لم يكتمل خلال pending_timeout (عامل
+    توقف فجأة) يُعتبر متروكاً ويمكن أخذه من جديد.
+    """
+
+    def __init__(self, path, ttl=24 * 3600, pending_timeout=120):
+        self.path = path
+        self.ttl = ttl
+        self.pending_timeout = pending_timeout
+        self._local = threading.local()
+        self._schema_ready = False
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            if not self._schema_ready:
+                self._init_schema(conn)
+                self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def reopen(self):
+        """ترك اتصالات العملية الأم بعد fork"""
+        self._local = threading.local()
+
+    def _init_schema(self, conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                status INTEGER,
+                body BLOB,
+                created_at REAL NOT NULL
+            )''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_created '
+                     'ON idempotency_keys(created_at)')
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def begin(self, key, fingerprint):
+        """None إذا حُجز المفتاح الآن، وإلا (fingerprint، status، body) المحفوظة"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM idempotency_keys WHERE created_at < ?', (now - self.ttl,))
+            row = conn.execute('SELECT fingerprint, status, body, created_at '
+                               'FROM idempotency_keys WHERE key = ?', (key,)).fetchone()
+            if row is not None and (row[1] is not None
+                                    or row[3] >= now - self.pending_timeout):
+                return row[:3]
+            conn.execute('INSERT OR REPLACE INTO idempotency_keys '
+                         '(key, fingerprint, status, body, created_at) VALUES (?, ?, NULL, NULL, ?)',
+                         (key, fingerprint, now))
+        return None
+
+    def finish(self, key, status, body):
+        self._connect().execute('UPDATE idempotency_keys SET status = ?, body = ? WHERE key = ?',
+                                (status, body, key))
+
+    def release(self, key):
+        """إلغاء الحجز حتى يمكن إعادة المحاولة بنفس المفتاح"""
+        self._connect().execute('DELETE FROM idempotency_keys WHERE key = ? AND status IS NULL',
+                                (key,))
+
+
+def idempotent(store):
+    """Decorator لمسار POST: نفس Idempotency-Key يعيد نفس الرد
+
+    الطلبات بلا مفتاح تمر كما هي. الردود 5xx لا تُحفظ حتى تنجح إعادة المحاولة.
+    """
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view(*args, **kwargs)
+            if not IDEMPOTENCY_KEY_PATTERN.match(key):
+                return jsonify({'success': False, 'message': 'مفتاح الطلب غير صالح'}), 400
+
+            key = f'{request.endpoint}:{key}'
+            fingerprint = hashlib.sha1(request.get_data()).hexdigest()
+            saved = store.begin(key, fingerprint)
+            if saved is not None:
+                saved_fingerprint, status, body = saved
+                if saved_fingerprint != fingerprint:
+                    return jsonify({'success': False,
+                                    'message': 'مفتاح الطلب مستعمل لبيانات أخرى'}), 422
+                if status is None:
+                    return _reject(409, 'الطلب قيد المعالجة', 1)
+                metrics.count('idempotent_replays', endpoint=request.endpoint)
+                response = make_response(body, status)
+                response.mimetype = 'application/json'
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                store.release(key)
+                raise
+            if response.status_code >= 500:
+                store.release(key)
+            else:
+                store.finish(key, response.status_code, response.get_data())
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,72 @@
+"""إحصائيات الطلاب المحسوبة مسبقاً
+
+العدادات تُحدّث مع كل تسجيل أو تغيير حالة بدل إعادة حسابها من كل الجدول في
+كل طلب، والتسجيلات تُجمع في سلال يومية حتى تُجاب أسئلة الفترات (7/30/90
+يوماً) بعدد خطوات بعدد أيام الفترة لا بعدد الطلاب.
+"""
+from datetime import date, timedelta
+
+# مفتاح القيم الفارغة في التوزيعات
+UNKNOWN = 'غير محدد'
+
+
+def _bump(counter, key, delta):
+    if key is None or key == '':
+        key = UNKNOWN
+    value = counter.get(key, 0) + delta
+    if value:
+        counter[key] = value
+    else:
+        counter.pop(key, None)
+
+
+class StudentAggregates:
+    """عدادات حسب البرنامج والحالة والولاية، وسلال يومية للتسجيلات"""
+
+    def __init__(self, active_status='نشط'):
+        self.active_status = active_status
+        self.reset()
+
+    def reset(self):
+        self.total = 0
+        self.by_program = {}
+        self.by_status = {}
+        self.by_state = {}
+        self.by_day = {}
+
+    def add(self, record, delta=1):
+        self.total += delta
+        _bump(self.by_program, record.get('البرنامج المختار'), delta)
+        _bump(self.by_status, record.get('الحالة'), delta)
+        _bump(self.by_state, record.get('الولاية'), delta)
+        day = str(record.get('تاريخ التسجيل') or '')[:10]
+        if day:
+            _bump(self.by_day, day, delta)
+
+    def remove(self, record):
+        self.add(record, -1)
+
+    @property
+    def active(self):
+        return self.by_status.get(self.active_status, 0)
+
+    def registrations_since(self, days, today=None):
+        """عدد التسجيلات خلال آخر days يوماً (اليوم الأول كاملاً)"""
+        today = today or date.today()
+        return sum(self.by_day.get((today - timedelta(days=i)).isoformat(), 0)
+                   for i in range(days + 1))
+
+    def daily(self, days, today=None):
+        """التسجيلات يوماً بيوم لآخر days يوماً، من الأقدم إلى الأحدث"""
+        today = today or date.today()
+        return [{'date': (today - timedelta(days=i)).isoformat(),
+                 'count': self.by_day.get((today - timedelta(days=i)).isoformat(), 0)}
+                for i in range(days - 1, -1, -1)]
+
+    def summary(self, recent_days=7):
+        return {
+            'total': self.total,
+            'active': self.active,
+            'programs': dict(sorted(self.by_program.items(), key=lambda item: -item[1])),
+            'recent': self.registrations_since(recent_days),
+        }
@@ -1,49 +1,125 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, send_file
+from flask import (Flask, render_template, request, jsonify, redirect, url_for, flash, session,
+                   abort, Response, stream_with_context, send_from_directory)
 from flask_cors import CORS
 from functools import wraps
-import pandas as pd
-import qrcode
+import hmac
 import os
+import re
+import threading
 from datetime import datetime
-import uuid
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
+from storage import (create_store, import_students_excel, STUDENT_COLUMNS, ACTIVE_STATUS,
+                     JournaledWorkbook, Compactor, StudentCache, CONTACT_COLUMNS,
+                     file_lock, files_signature)
+from qr_store import (QRCache, QR_MIMETYPES, qr_digest, ensure_qr_file,
+                      repoint_legacy_qrcodes)
+from tasks import TaskQueue
+from search import RecordSearch
+from schedule_views import ScheduleViews
+from content import ContentStore, SiteContent
+from page_cache import ResponseCache
+from metrics import metrics
+from profiler import SamplingProfiler
+from attendance import AttendanceLog
+from inbox import ContactInbox, MESSAGE_STATUSES, MESSAGE_TRANSITIONS
+from admission import (RateLimiter, ConcurrencyGate, IdempotencyStore, rate_limited, gated,
+                       idempotent)
+from assets import AssetManifest
+from imports import IMPORT_EXTENSIONS, new_student_id, read_table, validate_students
+from exports import (EXPORT_MIMETYPES, stream_csv, stream_file, write_xlsx,
+                     write_parquet)
 
 # إنشاء التطبيق
 app = Flask(__name__)
 app.secret_key = 'zawiya-tijania-secret-key-2026'
 CORS(app)
 
+# عدد الوكلاء (reverse proxies) أمام التطبيق، حتى يكون remote_addr عنوان العميل الحقيقي.
+# غير محدد = لا نعرف إن كان remote_addr عنوان الزائر (خلف موجّه منصة الاستضافة مثلاً
+# كل الزوار بعنوان واحد)، فيتوقف الحد لكل عميل. 0 = لا وكيل والعناوين حقيقية.
+PROXY_COUNT = os.environ.get('PROXY_COUNT')
+PROXY_COUNT = int(PROXY_COUNT) if PROXY_COUNT else None
+if PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_COUNT)
+
+# زمن كل مسار وزمن رسم القوالب، مع العمليات البطيئة المقاسة في الوحدات الأخرى
+metrics.init_app(app)
+
+# ملفات static المبنية بـ build_assets.py (بصمة في الاسم، مضغوطة مسبقاً)
+assets = AssetManifest(app.static_folder)
+assets.init_app(app)
+
 # إعدادات المسارات
 EXCEL_FILE = 'data/students.xlsx'
+DATABASE_FILE = 'data/school.db'
+TASKS_FILE = 'data/tasks.db'
+# ملفات مستقلة عن school.db: الكتابة فيها لا تغير بصمة ملفات الطلاب فلا تُعاد قراءتهم
+IDEMPOTENCY_FILE = 'data/idempotency.db'
+ATTENDANCE_FILE = 'data/attendance.db'
+CONTENT_FILE = 'data/content.db'
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'sqlite')
 CONTACT_FILE = 'data/contacts.xlsx'
+# رسائل الاتصال: ملف لكل شهر، وما قبل INBOX_HOT_MONTHS شهراً يُؤرشف مضغوطاً
+CONTACTS_DIR = 'data/contacts'
+INBOX_HOT_MONTHS = 6
+CONTACTS_SEARCH_LOCK = os.path.join(CONTACTS_DIR, 'search')
+MESSAGES_PER_PAGE = 25
+# فترة طي سجلات الإضافة في ملفات Excel (بالثواني) وحجم الدفعة
+COMPACT_INTERVAL = 30
+COMPACT_BATCH_SIZE = 200
 QRCODE_DIR = 'static/qrcodes'
+PROFILE_DIR = 'data/profiles'
 UPLOAD_FOLDER = 'static/uploads'
+# حدود ذاكرة رموز QR وحجم المربع المسموح في /qr
+QR_CACHE_ENTRIES = 256
+QR_CACHE_BYTES = 8 * 1024 * 1024
+QR_MIN_SIZE, QR_MAX_SIZE = 2, 20
+TASK_WORKERS = 2
+# ضبط التسجيل: طلبات لكل عميل في الثانية مع دفعة (فقط إذا حُدد PROXY_COUNT)، وعدد
+# التسجيلات المتزامنة
+REGISTER_RATE, REGISTER_BURST = 1, 10
+REGISTER_CONCURRENCY = 4
+REGISTER_GATE_FILE = 'data/register'
+# مسحات الحضور تُكتب دفعة كل ATTENDANCE_FLUSH_INTERVAL ثانية أو عند اكتمال الدفعة
+ATTENDANCE_BATCH_SIZE = 200
+ATTENDANCE_FLUSH_INTERVAL = 2.0
+ATTENDANCE_DAYS = 30
+STUDENT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_\-]{1,40}$')
 
 # بيانات الأدمن
 ADMIN_USERNAME = 'admin'
 ADMIN_PASSWORD = 'admin'
 
-# إنشاء المجلدات
-for folder in ['data', QRCODE_DIR, UPLOAD_FOLDER, 'static/images']:
-    os.makedirs(folder, exist_ok=True)
-
-# إنشاء ملف Excel للطلاب
-if not os.path.exists(EXCEL_FILE):
-    df = pd.DataFrame(columns=[
-        'رقم التسجيل', 'معرف فريد', 'الاسم', 'اللقب', 'العمر',
-        'الجنس', 'مكان الإقامة', 'الولاية', 'رقم الهاتف',
-        'البريد الإلكتروني', 'البرنامج المختار', 'تاريخ التسجيل', 'الحالة'
-    ])
-    df.to_excel(EXCEL_FILE, index=False, engine='openpyxl')
-
-# إنشاء ملف Excel للرسائل
-if not os.path.exists(CONTACT_FILE):
-    df = pd.DataFrame(columns=[
-        'رقم', 'الاسم', 'البريد الإلكتروني', 'رقم الهاتف',
-        'الموضوع', 'الرسالة', 'التاريخ', 'الحالة'
-    ])
-    df.to_excel(CONTACT_FILE, index=False, engine='openpyxl')
+qr_cache = QRCache(QRCODE_DIR, max_entries=QR_CACHE_ENTRIES, max_bytes=QR_CACHE_BYTES)
+
+# عينات المكدسات عند الطلب من صفحة المقاييس
+profiler = SamplingProfiler(PROFILE_DIR)
+
+# طابور المهام البطيئة (رموز QR وغيرها)، محفوظ على القرص
+task_queue = TaskQueue(TASKS_FILE, workers=TASK_WORKERS)
 
+# حماية /api/register من الدفعات والإرسال المزدوج
+register_limiter = (RateLimiter(REGISTER_RATE, REGISTER_BURST)
+                    if PROXY_COUNT is not None else None)
+register_gate = ConcurrencyGate(REGISTER_GATE_FILE, REGISTER_CONCURRENCY)
+idempotency_keys = IdempotencyStore(IDEMPOTENCY_FILE)
+
+# الحضور من مسح رموز QR، في الذاكرة ثم في القاعدة على دفعات
+attendance_log = AttendanceLog(ATTENDANCE_FILE, batch_size=ATTENDANCE_BATCH_SIZE,
+                               flush_interval=ATTENDANCE_FLUSH_INTERVAL)
+
+# المخازن وملفات البيانات تُفتح في init_app() لا عند الاستيراد
+students_backend = None
+students_store = None
+contact_inbox = None
+contacts_search = None
+content_store = None
+site_content = None
+compactor = None
+
+# المحتوى الأولي للبرامج والجدول والهيكل، يُنسخ إلى قاعدة البيانات عند أول
+# تشغيل ثم تُقرأ النسخة المحفوظة (site_content) بعد ذلك
 # بيانات البرامج التعليمية
 PROGRAMS = [
     {
@@ -220,6 +296,9 @@ STRUCTURE = {
     ]
 }
 
+# الصفحات العامة مرسومة مسبقاً لكل نسخة من المحتوى
+page_cache = ResponseCache()
+
 # الإحصائيات
 STATISTICS = {
     'students': 515,
@@ -229,6 +308,34 @@ STATISTICS = {
     'years': 223
 }
 
+# حالات الطالب المسموحة
+STUDENT_STATUSES = ['نشط', 'متوقف', 'متخرج']
+
+# حجم صفحة جدول الطلاب في لوحة التحكم
+STUDENTS_PER_PAGE = 50
+STUDENTS_MAX_PER_PAGE = 500
+
+# أقصى عدد إيميلات في الصفحة الواحدة من /admin/get-emails
+EMAILS_PER_PAGE = 1000
+
+# عدد النتائج الافتراضي والأقصى في /admin/api/search
+SEARCH_RESULTS = 20
+SEARCH_MAX_RESULTS = 100
+
+# حقول نموذج التسجيل المطلوبة، تُطبق أيضاً على الاستيراد الجماعي
+REQUIRED_FIELDS = ['firstName', 'lastName', 'age', 'phone', 'email', 'address', 'state', 'program']
+
+# أقصى عدد أسطر في ملف الاستيراد الجماعي
+IMPORT_MAX_ROWS = 20000
+
+# فترات الإحصائيات المتاحة في /api/statistics (بالأيام)
+STATISTICS_WINDOWS = [7, 30, 90]
+
+# رمز يرسله جامع المقاييس (Prometheus) في Authorization: Bearer لقراءة /metrics دون
+# تسجيل دخول. غير محدد = الأدمن فقط (العنوان المحلي لا يكفي: خلف وكيل على نفس
+# الخادم كل الطلبات تأتي من 127.0.0.1)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
 # ==================== Decorators ====================
 
 def login_required(f):
@@ -240,57 +347,56 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def content_version():
+    return site_content.version
+
+def home_version():
+    """الرئيسية تعرض أيضاً عدد الطلاب الحالي"""
+    return site_content.version, students_store.statistics().total
+
 # ==================== Public Routes ====================
 
 @app.route('/')
+@page_cache.cached(home_version)
 def index():
     """الصفحة الرئيسية"""
     return render_template('index.html',
-                         programs=PROGRAMS,
-                         statistics=STATISTICS)
+                         programs=site_content['programs'],
+                         statistics=live_statistics())
 
 @app.route('/register')
+@page_cache.cached(content_version)
 def register_page():
     """صفحة التسجيل"""
-    return render_template('register.html', programs=PROGRAMS)
+    return render_template('register.html', programs=site_content['programs'])
 
 @app.route('/contact')
+@page_cache.cached(content_version)
 def contact_page():
     """صفحة الاتصال"""
     return render_template('contact.html')
 
 @app.route('/structure')
+@page_cache.cached(content_version)
 def structure_page():
     """صفحة الهيكل التنظيمي"""
-    return render_template('structure.html', structure=STRUCTURE)
+    return render_template('structure.html', structure=site_content['structure'])
 
 @app.route('/schedule/<student_id>')
 def schedule_page(student_id):
     """صفحة جدول الحصص للطالب"""
     try:
-        df = pd.read_excel(EXCEL_FILE, engine='openpyxl')
-        student = df[df['معرف فريد'] == student_id]
+        student_data = students_store.get(student_id)
         
-        if student.empty:
+        if student_data is None:
             flash('معرف الطالب غير صحيح', 'error')
             return redirect(url_for('index'))
         
-        student_data = student.iloc[0].to_dict()
-        student_program = student_data['البرنامج المختار']
-        filtered_schedule = [s for s in SCHEDULE 
-                           if s['program'] == student_program or 
-                           s['program'] in ['review', 'tijani']]
-        
-        qrcodes = {}
-        for schedule in filtered_schedule:
-            qr_filename = f"qr_{schedule['id']}_{student_id}.png"
-            qrcodes[schedule['id']] = qr_filename
-        
+        # قائمة الحصص مرسومة مسبقاً لكل برنامج، والطالب يُضاف فقط
         return render_template('schedule.html',
                              student=student_data,
-                             schedules=filtered_schedule,
-                             qrcodes=qrcodes,
-                             all_programs=PROGRAMS)
+                             schedule_grid=schedule_views.fragment(student_data['البرنامج المختار']),
+                             all_programs=site_content['programs'])
     except Exception as e:
         print(f"Error in schedule_page: {str(e)}")
         flash('حدث خطأ في تحميل الجدول', 'error')
@@ -334,22 +440,22 @@ def admin_logout():
 def admin_dashboard():
     """لوحة تحكم الأدمن"""
     try:
-        df = pd.read_excel(EXCEL_FILE, engine='openpyxl')
-        students = df.to_dict('records')
-        
-        stats = {
-            'total': len(df),
-            'active': len(df[df['الحالة'] == 'نشط']) if not df.empty else 0,
-            'programs': df['البرنامج المختار'].value_counts().to_dict() if not df.empty else {},
-            'recent': len(df[pd.to_datetime(df['تاريخ التسجيل'], errors='coerce') >= 
-                           pd.Timestamp.now() - pd.Timedelta(days=7)]) if not df.empty else 0
-        }
+        aggregates = students_store.statistics()
+        stats = aggregates.summary(recent_days=7)
+        # مسحات هذا العامل التي لم تُكتب بعد، والبقية تُكتب خلال ثوانٍ
+        attendance_log.flush()
         
         return render_template('admin_dashboard.html', 
-                             students=students, 
                              stats=stats,
-                             schedules=SCHEDULE,
-                             programs=PROGRAMS)
+                             states=sorted(aggregates.by_state),
+                             statuses=STUDENT_STATUSES,
+                             message_statuses=MESSAGE_STATUSES,
+                             message_transitions=MESSAGE_TRANSITIONS,
+                             schedules=site_content['schedule'],
+                             schedule_titles={s['id']: s['title'] for s in site_content['schedule']},
+                             attendance=attendance_log.sessions(ATTENDANCE_DAYS),
+                             attendance_days=ATTENDANCE_DAYS,
+                             programs=site_content['programs'])
     except Exception as e:
         print(f"Error in admin dashboard: {str(e)}")
         return f"Error loading dashboard: {str(e)}", 500
@@ -363,48 +469,296 @@ def update_schedule():
         schedule_id = int(data['id'])
         new_link = data['meet_link']
         
-        for schedule in SCHEDULE:
-            if schedule['id'] == schedule_id:
-                schedule['meet_link'] = new_link
-                
-                qr_filename = f"qr_schedule_{schedule_id}_updated.png"
-                qr_path = os.path.join(QRCODE_DIR, qr_filename)
-                
-                qr = qrcode.QRCode(
-                    version=1,
-                    error_correction=qrcode.constants.ERROR_CORRECT_L,
-                    box_size=10,
-                    border=4
-                )
-                qr.add_data(new_link)
-                qr.make(fit=True)
-                img = qr.make_image(fill_color="black", back_color="white")
-                img.save(qr_path)
-                
-                return jsonify({
-                    'success': True, 
-                    'message': 'تم تحديث الرابط وإنشاء QR Code جديد',
-                    'qr_code': qr_filename
-                })
+        if not any(s['id'] == schedule_id for s in site_content['schedule']):
+            return jsonify({'success': False, 'message': 'الحصة غير موجودة'}), 404
+        
+        def change(schedules):
+            schedule = next(s for s in schedules if s['id'] == schedule_id)
+            schedule['meet_link'] = new_link
+            return schedule
+        
+        # يُحفظ في القاعدة فيراه كل العمال، وتُعاد بناء الجداول مع التحميل
+        schedule = site_content.modify('schedule', change)
+        job_id = task_queue.enqueue('qr.repoint', schedule_id=schedule_id,
+                                    root=request.url_root)
+        
+        return jsonify({
+            'success': True, 
+            'message': 'تم تحديث الرابط، ورموز QR الحالية توجّه إليه مباشرة',
+            'qr_code': schedule_qr_url(schedule),
+            'job': task_queue.get(job_id)
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/admin/api/students')
+@login_required
+def list_students():
+    """صفحة من قائمة الطلاب مع التصفية والترتيب"""
+    try:
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', STUDENTS_PER_PAGE, type=int), 1),
+                       STUDENTS_MAX_PER_PAGE)
+        sort = request.args.get('sort', 'reg')
+        if sort not in students_store.SORT_KEYS:
+            sort = 'reg'
+        descending = request.args.get('order', 'asc') == 'desc'
+        filters = {
+            'program': request.args.get('program'),
+            'status': request.args.get('status'),
+            'state': request.args.get('state')
+        }
+        
+        predicate = None
+        search = request.args.get('q', '').strip()
+        if search:
+            matches = set(students_store.search(search))
+            def predicate(student):
+                return student['معرف فريد'] in matches
+        
+        total, students = students_store.query(filters, sort=sort, descending=descending,
+                                               offset=(page - 1) * per_page, limit=per_page,
+                                               predicate=predicate)
+        return jsonify({
+            'success': True,
+            'students': students,
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'pages': max((total + per_page - 1) // per_page, 1)
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/admin/import-students', methods=['POST'])
+@login_required
+def import_students():
+    """استيراد طلاب من ملف XLSX أو CSV: الأسطر الصالحة تُكتب دفعة واحدة"""
+    try:
+        upload = request.files.get('file')
+        if upload is None or not upload.filename:
+            return jsonify({'success': False, 'message': 'لم يتم اختيار ملف'}), 400
+        # الملف لا يُحفظ على القرص، والاسم للامتداد فقط (secure_filename يحذف الحروف العربية)
+        filename = upload.filename
+        if os.path.splitext(filename)[1].lower() not in IMPORT_EXTENSIONS:
+            return jsonify({'success': False, 'message': 'الصيغ المقبولة: xlsx و csv'}), 400
+        
+        df = read_table(upload.stream, filename)
+        if len(df) > IMPORT_MAX_ROWS:
+            return jsonify({'success': False,
+                            'message': f'الملف يتجاوز {IMPORT_MAX_ROWS} سطر'}), 400
+        
+        programs = [p['id'] for p in site_content['programs']]
+        records, errors = validate_students(df, REQUIRED_FIELDS, programs)
+        if records and request.form.get('dry_run') != '1':
+            students_store.add_many(records)
+            if STORAGE_BACKEND == 'excel':
+                compactor.notify(students_backend.workbook)
+            # رمز واحد لكل حصة يشترك فيه الجميع، فتكفي مهمة لكل برنامج
+            for program in sorted({r['البرنامج المختار'] for r in records}):
+                task_queue.enqueue('qr.prepare', program=program, root=request.url_root)
+            imported = len(records)
+        else:
+            imported = 0
+        
+        return jsonify({
+            'success': True,
+            'message': f'تم استيراد {imported} من {len(df)} طالب',
+            'total': len(df),
+            'valid': len(records),
+            'imported': imported,
+            'errors': errors
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        print(f"Error in import: {str(e)}")
+        return jsonify({'success': False, 'message': f'حدث خطأ: {str(e)}'}), 500
+
+@app.route('/admin/api/search')
+@login_required
+def search_records():
+    """بحث نصي في الطلاب والرسائل (يتسامح مع الهمزات والتشكيل والأخطاء البسيطة)"""
+    try:
+        query = request.args.get('q', '').strip()
+        scope = request.args.get('scope', 'all')
+        limit = min(max(request.args.get('limit', SEARCH_RESULTS, type=int), 1),
+                    SEARCH_MAX_RESULTS)
+        results = {}
+        if scope in ('all', 'students'):
+            results['students'] = [students_store.get(student_id)
+                                   for student_id in students_store.search(query, limit)]
+        if scope in ('all', 'contacts'):
+            results['contacts'] = contacts_search.search(query, limit)
+        return jsonify({'success': True, 'query': query, **results})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/admin/api/messages')
+@login_required
+def list_messages():
+    """صفحة من صندوق الرسائل، الأحدث أولاً، مع التصفية بالحالة أو الشهر"""
+    try:
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', MESSAGES_PER_PAGE, type=int), 1),
+                       STUDENTS_MAX_PER_PAGE)
+        month = request.args.get('month') or None
+        total, messages = contact_inbox.query(status=request.args.get('status') or None,
+                                              month=month, offset=(page - 1) * per_page,
+                                              limit=per_page)
+        return jsonify({
+            'success': True,
+            'messages': messages,
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'pages': max((total + per_page - 1) // per_page, 1),
+            'counts': contact_inbox.counts(),
+            'months': contact_inbox.hot()[::-1],
+            'archived_months': contact_inbox.archived()[::-1],
+            'archived': month in contact_inbox.archived()
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/admin/api/messages/<message_id>/status', methods=['POST'])
+@login_required
+def update_message_status(message_id):
+    """نقل رسالة إلى حالة جديدة (مقروءة، تم الرد...)"""
+    try:
+        status = (request.get_json() or {}).get('status')
+        # عبر فهرس البحث حتى تظهر الحالة الجديدة في نتائجه دون إعادة تحميل
+        message = contacts_search.write(lambda: contact_inbox.set_status(message_id, status))
+        if message is None:
+            return jsonify({'success': False,
+                            'message': 'الرسالة غير موجودة أو مؤرشفة'}), 404
+        return jsonify({'success': True, 'message': 'تم تحديث حالة الرسالة',
+                        'contact': message})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/admin/students/<student_id>/status', methods=['POST'])
+@login_required
+def update_student_status(student_id):
+    """تغيير حالة طالب"""
+    try:
+        data = request.get_json()
+        status = data.get('status')
+        
+        if status not in STUDENT_STATUSES:
+            return jsonify({'success': False, 'message': 'حالة غير معروفة'}), 400
         
-        return jsonify({'success': False, 'message': 'الحصة غير موجودة'}), 404
+        if not students_store.set_status(student_id, status):
+            return jsonify({'success': False, 'message': 'معرف الطالب غير صحيح'}), 404
+        
+        return jsonify({'success': True, 'message': 'تم تحديث حالة الطالب'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/admin/qr-jobs')
+@login_required
+def get_qr_jobs():
+    """حالة مهام تحديث رموز QR"""
+    return jsonify({'success': True, 'jobs': task_queue.recent('qr.repoint')})
+
+@app.route('/admin/qr-jobs/<int:job_id>')
+@login_required
+def get_qr_job(job_id):
+    """تقدم مهمة تحديث رموز QR"""
+    job = task_queue.get(job_id)
+    if job is None or job['name'] != 'qr.repoint':
+        return jsonify({'success': False, 'message': 'المهمة غير موجودة'}), 404
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/admin/metrics')
+@login_required
+def admin_metrics():
+    """زمن المسارات والعمليات البطيئة وحالة الذاكرة المؤقتة في هذا العامل"""
+    return render_template('admin_metrics.html',
+                           routes=metrics.snapshot('http_request_duration_seconds'),
+                           spans=metrics.snapshot('span_duration_seconds'),
+                           templates=metrics.snapshot('template_render_seconds'),
+                           counters=metrics.counter_rows(),
+                           started=datetime.fromtimestamp(metrics.started),
+                           pid=os.getpid(),
+                           profiler=profiler,
+                           profiles=profiler.profiles())
+
+@app.route('/admin/metrics/reset', methods=['POST'])
+@login_required
+def reset_metrics():
+    metrics.reset()
+    return jsonify({'success': True})
+
+@app.route('/admin/metrics/profile', methods=['POST'])
+@login_required
+def toggle_profiler():
+    """تشغيل أخذ العينات لمدة محددة أو إيقافه"""
+    data = request.get_json(silent=True) or {}
+    if data.get('action') == 'stop':
+        profiler.stop()
+        return jsonify({'success': True, 'running': False})
+    try:
+        seconds = int(data.get('seconds') or 30)
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({'success': False, 'message': 'مدة أخذ العينات يجب أن تكون عدداً من الثواني'}), 400
+    if not profiler.start(seconds):
+        return jsonify({'success': False, 'message': 'أخذ العينات يعمل بالفعل'}), 409
+    return jsonify({'success': True, 'running': True, 'pid': os.getpid()})
+
+@app.route('/admin/metrics/profiles/<name>')
+@login_required
+def download_profile(name):
+    if name not in profiler.profiles(limit=None):
+        abort(404)
+    return send_from_directory(os.path.abspath(PROFILE_DIR), name, as_attachment=True,
+                               mimetype='text/plain')
+
 @app.route('/admin/export-students')
 @login_required
 def export_students():
-    """تصدير بيانات الطلاب إلى Excel"""
+    """تصدير بيانات الطلاب (xlsx أو csv أو parquet) مع التصفية"""
     try:
-        return send_file(
-            EXCEL_FILE, 
-            as_attachment=True, 
-            download_name=f'students_export_{datetime.now().strftime("%Y%m%d")}.xlsx'
+        export_format = request.args.get('format', 'xlsx')
+        if export_format not in EXPORT_MIMETYPES:
+            flash('صيغة التصدير غير مدعومة', 'error')
+            return redirect(url_for('admin_dashboard'))
+        
+        rows = students_store.iter_filtered(
+            program=request.args.get('program') or None,
+            status=request.args.get('status') or None,
+            date_from=request.args.get('from') or None,
+            date_to=request.args.get('to') or None
         )
+        
+        if export_format == 'csv':
+            body = stream_with_context(stream_csv(rows, STUDENT_COLUMNS))
+        elif export_format == 'parquet':
+            try:
+                body = stream_file(write_parquet(rows, STUDENT_COLUMNS))
+            except ImportError:
+                flash('التصدير إلى Parquet يتطلب تثبيت pyarrow', 'error')
+                return redirect(url_for('admin_dashboard'))
+        else:
+            body = stream_file(write_xlsx(rows, STUDENT_COLUMNS))
+        
+        filename = f'students_export_{datetime.now().strftime("%Y%m%d")}.{export_format}'
+        return Response(body, mimetype=EXPORT_MIMETYPES[export_format], headers={
+            'Content-Disposition': f'attachment; filename={filename}'
+        })
     except Exception as e:
         flash(f'خطأ في التصدير: {str(e)}', 'error')
         return redirect(url_for('admin_dashboard'))
 
+def _json_int(data, key, default):
+    """عدد صحيح من جسم JSON، أو default إذا لم يكن عدداً، كما في args.get(type=int)"""
+    try:
+        return int(data.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
 @app.route('/admin/get-emails', methods=['POST'])
 @login_required
 def get_emails():
@@ -412,40 +766,69 @@ def get_emails():
     try:
         data = request.get_json()
         program = data.get('program', 'all')
+        active_only = data.get('active_only', True)
+        page = max(_json_int(data, 'page', 1), 1)
+        per_page = min(max(_json_int(data, 'per_page', EMAILS_PER_PAGE), 1), EMAILS_PER_PAGE)
         
-        df = pd.read_excel(EXCEL_FILE, engine='openpyxl')
-        
-        if program != 'all':
-            df = df[df['البرنامج المختار'] == program]
-        
-        emails = df['البريد الإلكتروني'].tolist()
+        emails = students_store.emails(None if program == 'all' else program,
+                                       ACTIVE_STATUS if active_only else None)
+        total = len(emails)
         
         return jsonify({
             'success': True, 
-            'emails': emails,
-            'count': len(emails)
+            'emails': emails[(page - 1) * per_page:page * per_page],
+            'count': total,
+            'page': page,
+            'pages': max((total + per_page - 1) // per_page, 1)
         })
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/admin/export-emails')
+@login_required
+def export_emails():
+    """تحميل قائمة الإيميلات كملف نصي، إيميل في كل سطر"""
+    program = request.args.get('program', 'all')
+    active_only = request.args.get('active_only', '1') != '0'
+    emails = students_store.emails(None if program == 'all' else program,
+                                   ACTIVE_STATUS if active_only else None)
+    
+    def generate():
+        for i in range(0, len(emails), EMAILS_PER_PAGE):
+            yield '\n'.join(emails[i:i + EMAILS_PER_PAGE]) + '\n'
+    
+    filename = f'emails_{secure_filename(program) or "all"}_{datetime.now().strftime("%Y%m%d")}.txt'
+    return Response(generate(), mimetype='text/plain', headers={
+        'Content-Disposition': f'attachment; filename={filename}'
+    })
+
 # ==================== APIs ====================
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """المقاييس بصيغة Prometheus، للأدمن أو لمن يحمل METRICS_TOKEN فقط"""
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    allowed = METRICS_TOKEN and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())
+    if not allowed and 'admin_logged_in' not in session:
+        abort(404)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/register', methods=['POST'])
+@rate_limited(register_limiter)
+@idempotent(idempotency_keys)
+@gated(register_gate)
 def register_student():
     """API لتسجيل طالب جديد"""
     try:
         data = request.get_json()
-        required_fields = ['firstName', 'lastName', 'age', 'phone', 'email', 'address', 'state', 'program']
         
-        for field in required_fields:
+        for field in REQUIRED_FIELDS:
             if not data.get(field):
                 return jsonify({'success': False, 'message': f'الحقل {field} مطلوب'}), 400
         
-        df = pd.read_excel(EXCEL_FILE, engine='openpyxl')
-        student_id = 'STD' + str(uuid.uuid4())[:8].upper()
+        student_id = new_student_id()
         
         new_record = {
-            'رقم التسجيل': len(df) + 1,
             'معرف فريد': student_id,
             'الاسم': data['firstName'],
             'اللقب': data['lastName'],
@@ -460,10 +843,20 @@ def register_student():
             'الحالة': 'نشط'
         }
         
-        df = pd.concat([df, pd.DataFrame([new_record])], ignore_index=True)
-        df.to_excel(EXCEL_FILE, index=False, engine='openpyxl')
+        record, created = students_store.add_unique(new_record)
+        if not created:
+            # نفس الطالب أرسل النموذج مرة أخرى: نفس المعرف بدل تسجيل ثانٍ
+            return jsonify({
+                'success': True,
+                'duplicate': True,
+                'message': 'أنت مسجل مسبقاً في هذا البرنامج',
+                'student_id': record['معرف فريد']
+            })
+        if STORAGE_BACKEND == 'excel':
+            compactor.notify(students_backend.workbook)
         
-        create_qr_codes_for_student(student_id, data['program'])
+        # رموز QR تُجهز في الخلفية، والطالب يحصل على معرفه فوراً
+        task_queue.enqueue('qr.prepare', program=data['program'], root=request.url_root)
         
         return jsonify({
             'success': True,
@@ -479,10 +872,8 @@ def submit_contact():
     """API لإرسال رسالة اتصال"""
     try:
         data = request.get_json()
-        df = pd.read_excel(CONTACT_FILE, engine='openpyxl')
         
         new_record = {
-            'رقم': len(df) + 1,
             'الاسم': data['name'],
             'البريد الإلكتروني': data['email'],
             'رقم الهاتف': data.get('phone', ''),
@@ -492,8 +883,8 @@ def submit_contact():
             'الحالة': 'جديدة'
         }
         
-        df = pd.concat([df, pd.DataFrame([new_record])], ignore_index=True)
-        df.to_excel(CONTACT_FILE, index=False, engine='openpyxl')
+        # سطر واحد في ملف الشهر الحالي
+        contacts_search.write(lambda: contact_inbox.append(new_record))
         
         return jsonify({
             'success': True,
@@ -502,27 +893,74 @@ def submit_contact():
     except Exception as e:
         return jsonify({'success': False, 'message': f'حدث خطأ: {str(e)}'}), 500
 
+@app.route('/go/<int:schedule_id>')
+@app.route('/go/<int:schedule_id>/<student_id>')
+def join_session(schedule_id, student_id=None):
+    """وجهة رموز QR: تحويل إلى رابط الحصة الحالي وتسجيل المسح في الذاكرة"""
+    meet_link = schedule_views.meet_link(schedule_id)
+    if meet_link is None:
+        abort(404)
+    # المعرف لا يُتحقق منه هنا حتى لا يمر المسح على مخزن الطلاب
+    if student_id is not None and not STUDENT_ID_PATTERN.match(student_id):
+        student_id = None
+    attendance_log.record(schedule_id, student_id)
+    response = redirect(meet_link)
+    # كل مسح يجب أن يصل إلى الخادم
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/qr/<int:schedule_id>.<fmt>')
+def schedule_qr(schedule_id, fmt):
+    """رمز QR لرابط دخول الحصة، يُرسم عند أول طلب ويبقى في الذاكرة"""
+    if schedule_views.meet_link(schedule_id) is None or fmt not in QR_MIMETYPES:
+        abort(404)
+    payload = join_url(schedule_id)
+    
+    options = {}
+    size = request.args.get('size', type=int)
+    if size is not None:
+        options['box_size'] = min(max(size, QR_MIN_SIZE), QR_MAX_SIZE)
+    
+    digest, body = qr_cache.get(payload, fmt, **options)
+    response = Response(body, mimetype=QR_MIMETYPES[fmt])
+    response.set_etag(digest)
+    if request.args.get('v') == qr_digest(payload, fmt):
+        # الرابط يحمل بصمة المحتوى: لن يتغير أبداً
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'public, no-cache'
+    return response.make_conditional(request)
+
 @app.route('/api/schedules')
+@page_cache.cached(content_version)
 def get_schedules():
     """API للحصول على جميع الحصص"""
-    return jsonify(SCHEDULE)
+    return jsonify(site_content['schedule'])
 
 @app.route('/api/programs')
+@page_cache.cached(content_version)
 def get_programs():
     """API للحصول على البرامج"""
-    return jsonify(PROGRAMS)
+    return jsonify(site_content['programs'])
 
 @app.route('/api/statistics')
 def get_statistics():
     """API للإحصائيات"""
     try:
-        df = pd.read_excel(EXCEL_FILE, engine='openpyxl')
+        days = request.args.get('days', 30, type=int)
+        if days not in STATISTICS_WINDOWS:
+            days = 30
+        aggregates = students_store.statistics()
         stats = {
-            'total_students': len(df),
-            'active_students': len(df[df['الحالة'] == 'نشط']),
-            'programs_distribution': df['البرنامج المختار'].value_counts().to_dict() if not df.empty else {},
-            'recent_registrations': len(df[pd.to_datetime(df['تاريخ التسجيل'], errors='coerce') >= 
-                                         pd.Timestamp.now() - pd.Timedelta(days=30)]) if not df.empty else 0
+            'total_students': aggregates.total,
+            'active_students': aggregates.active,
+            'programs_distribution': aggregates.summary()['programs'],
+            'status_distribution': dict(aggregates.by_status),
+            'states_distribution': dict(aggregates.by_state),
+            'recent_registrations': aggregates.registrations_since(days),
+            'registrations': {str(window): aggregates.registrations_since(window)
+                              for window in STATISTICS_WINDOWS},
+            'daily_registrations': aggregates.daily(days)
         }
         return jsonify(stats)
     except:
@@ -530,33 +968,173 @@ def get_statistics():
 
 # ==================== Helper Functions ====================
 
-def create_qr_codes_for_student(student_id, program):
-    """إنشاء QR codes للطالب"""
-    relevant_schedules = [s for s in SCHEDULE 
-                         if s['program'] == program or 
-                         s['program'] in ['review', 'tijani']]
+def live_statistics():
+    """إحصائيات الصفحة الرئيسية مع عدد الطلاب الحالي من العدادات المحسوبة"""
+    try:
+        return dict(STATISTICS, students=students_store.statistics().total,
+                    programs=len(site_content['programs']))
+    except Exception as e:
+        print(f"Error in live_statistics: {str(e)}")
+        return STATISTICS
+
+def join_url(schedule_id):
+    """رابط الدخول الكامل الذي يحمله رمز QR، ثابت مهما تغير رابط Google Meet"""
+    return url_for('join_session', schedule_id=schedule_id, _external=True)
+
+def schedule_qr_url(schedule, fmt='png'):
+    """رابط رمز QR للحصة، يتضمن بصمة المحتوى حتى يتغير معه"""
+    return url_for('schedule_qr', schedule_id=schedule['id'], fmt=fmt,
+                   v=qr_digest(join_url(schedule['id']), fmt))
+
+def render_schedule_grid(schedules):
+    """جزء صفحة الجدول الخاص بقائمة الحصص، يُرسم مرة لكل برنامج"""
+    return render_template('schedule_grid.html', schedules=schedules,
+                           qrcodes={s['id']: schedule_qr_url(s) for s in schedules},
+                           join_links={s['id']: url_for('join_session', schedule_id=s['id'])
+                                       for s in schedules})
+
+# حصص كل برنامج وجزء الصفحة المرسوم لها، يُعاد بناؤها مع كل نسخة جديدة من الجدول
+schedule_views = ScheduleViews([], render_schedule_grid)
+
+@app.before_request
+def refresh_site_content():
+    """تحميل المحتوى من جديد إذا عدّله عامل آخر"""
+    if request.endpoint != 'static':
+        if not _initialized:
+            init_app()
+        site_content.refresh()
+
+# ==================== Initialization ====================
+
+_init_lock = threading.Lock()
+_initialized = False
+
+def _open_stores():
+    """إنشاء المجلدات وفتح المخازن وتحميل النسخ المفهرسة"""
+    global students_backend, students_store, contact_inbox, contacts_search
+    global content_store, site_content, compactor
     
-    for schedule in relevant_schedules:
-        qr_filename = f"qr_{schedule['id']}_{student_id}.png"
-        qr_path = os.path.join(QRCODE_DIR, qr_filename)
-        
-        if not os.path.exists(qr_path):
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4
-            )
-            qr.add_data(schedule['meet_link'])
-            qr.make(fit=True)
-            img = qr.make_image(fill_color="black", back_color="white")
-            img.save(qr_path)
+    for folder in ['data', CONTACTS_DIR, QRCODE_DIR, UPLOAD_FOLDER, 'static/images']:
+        os.makedirs(folder, exist_ok=True)
+    
+    # محرك تخزين الطلاب، مع ترحيل ملف Excel القديم عند أول تشغيل
+    if STORAGE_BACKEND == 'excel':
+        students_backend = create_store(STORAGE_BACKEND, path=EXCEL_FILE)
+    else:
+        students_backend = create_store(STORAGE_BACKEND, path=DATABASE_FILE)
+        # القفل يمنع عمال gunicorn من استيراد نفس الملف معاً
+        with file_lock(DATABASE_FILE):
+            if students_backend.count() == 0:
+                import_students_excel(students_backend, EXCEL_FILE)
+    
+    # نسخة مفهرسة في الذاكرة، تُحمّل من جديد فقط عند تغير الملفات
+    students_store = StudentCache(students_backend)
+    
+    # رسائل الاتصال في ملفات شهرية، مع ترحيل ملف Excel القديم عند أول تشغيل
+    contact_inbox = ContactInbox(CONTACTS_DIR, hot_months=INBOX_HOT_MONTHS)
+    contact_inbox.migrate_workbook(JournaledWorkbook(CONTACT_FILE, CONTACT_COLUMNS, key='رقم'))
+    
+    # فهرس البحث في رسائل الأشهر الحالية (الاسم والموضوع والنص...)
+    contacts_search = RecordSearch(contact_inbox.records,
+                                   lambda: files_signature(contact_inbox.files()),
+                                   key='رقم', fields=['الاسم', 'البريد الإلكتروني',
+                                                      'رقم الهاتف', 'الموضوع', 'الرسالة'],
+                                   write_lock=lambda: file_lock(CONTACTS_SEARCH_LOCK))
+    
+    # المحتوى المشترك بين العمال مع رقم نسخة، يُحدّث في بداية كل طلب
+    # في ملف مستقل عن school.db، مع نقل ما كان فيه من قبل عند أول تشغيل
+    content_store = ContentStore(CONTENT_FILE, {
+        'programs': PROGRAMS,
+        'schedule': SCHEDULE,
+        'structure': STRUCTURE
+    }, legacy_path=DATABASE_FILE)
+    site_content = SiteContent(content_store)
+    site_content.on_reload(lambda content: schedule_views.rebuild(content['schedule']))
+    
+    # طي السجلات في ملفات Excel وأرشفة أشهر الرسائل القديمة في الخلفية
+    journaled_workbooks = [contact_inbox]
+    if STORAGE_BACKEND == 'excel':
+        journaled_workbooks.append(students_backend.workbook)
+    compactor = Compactor(journaled_workbooks, interval=COMPACT_INTERVAL,
+                          batch_size=COMPACT_BATCH_SIZE)
+    
+    site_content.refresh()
+    students_store.refresh()
+
+def init_app(start_background=True):
+    """تهيئة الملفات والمخازن مرة واحدة لكل عملية، ثم خيوط الخلفية
+
+    الاستيراد لا يلمس القرص ولا يحمّل pandas أو openpyxl أو qrcode. مع
+    gunicorn --preload تُستدعى في العملية الأم بـ start_background=False حتى
+    يرث العمال البيانات المحمّلة، ثم after_fork() في كل عامل.
+    """
+    global _initialized
+    with _init_lock:
+        if not _initialized:
+            _open_stores()
+            _initialized = True
+    if start_background:
+        if not compactor.is_alive():
+            compactor.start()
+        task_queue.start()
+        attendance_log.start()
+
+def after_fork():
+    """في العامل بعد fork: اتصالات SQLite جديدة ثم تشغيل خيوط الخلفية"""
+    if _initialized:
+        for store in (students_store, content_store, task_queue, idempotency_keys,
+                      attendance_log):
+            store.reopen()
+    init_app()
+
+# ==================== Background Tasks ====================
+
+@task_queue.handler('qr.prepare')
+def prepare_program_qrcodes(task_id, program, root=None):
+    """إنشاء ملفات QR المشتركة لحصص البرنامج مسبقاً
+
+    root عنوان الموقع كما وصل في طلب التسجيل، لأن الرمز يحمل رابطاً كاملاً.
+    """
+    if root is None:
+        # مهمة أقدم من روابط الدخول: الرموز تُرسم عند أول طلب
+        return
+    site_content.refresh()
+    with app.test_request_context(base_url=root):
+        for schedule in schedule_views.schedules(program):
+            ensure_qr_file(QRCODE_DIR, join_url(schedule['id']))
+
+@task_queue.handler('qr.repoint')
+def repoint_schedule_qrcodes(task_id, schedule_id, root=None, meet_link=None):
+    """توجيه ملفات QR القديمة للطلاب إلى رابط دخول الحصة /go/<id>
+
+    بعدها تمر مسحاتها بتسجيل الحضور، ولا تحتاج إعادة كتابة عند تغير رابط
+    Google Meet (الملفات الموجهة مسبقاً تُترك). meet_link للمهام الأقدم فقط.
+    """
+    def superseded():
+        return any(p['schedule_id'] == schedule_id
+                   for p in task_queue.newer(task_id, 'qr.repoint'))
+    
+    def repoint(payload):
+        repoint_legacy_qrcodes(
+            QRCODE_DIR, schedule_id, payload,
+            progress=lambda done, total=None: task_queue.progress(task_id, done, total),
+            cancelled=superseded)
+    
+    if root is None:
+        repoint(meet_link)
+        return
+    with app.test_request_context(base_url=root):
+        repoint(join_url(schedule_id))
 
 # ==================== Error Handlers ====================
 
 @app.errorhandler(404)
 def not_found(e):
-    return render_template('index.html', programs=PROGRAMS, statistics=STATISTICS), 404
+    # نفس الصفحة لكل الروابط غير الموجودة، تُرسم مرة لكل نسخة
+    return page_cache.respond(('404',), home_version(),
+                              lambda: (render_template('index.html',
+                                                       programs=site_content['programs'],
+                                                       statistics=live_statistics()), 404))
 
 @app.errorhandler(500)
 def server_error(e):
@@ -566,7 +1144,6 @@ def server_error(e):
 
 if __name__ == '__main__':
     import webbrowser
-    import threading
     import time
     
     def open_browser():
@@ -592,6 +1169,8 @@ if __name__ == '__main__':
     print("  [!] Press Ctrl+C to stop\n")
     print("=" * 70 + "\n")
     
+    init_app()
+    
     # Start browser
     browser_thread = threading.Thread(target=open_browser)
     browser_thread.daemon = True
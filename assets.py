@@ -0,0 +1,72 @@
+"""ربط ملفات static المبنية (build_assets.py) بالتطبيق
+
+url_for('static', filename='css/style.css') يصبح رابط النسخة المبنية
+dist/css/style.<بصمة>.css إذا وُجد manifest.json، وإلا يبقى كما هو (أثناء
+التطوير). الملفات المبنية تُرسل بترويسة immutable لسنة، مع نسخة .br أو .gz
+الجاهزة حسب ما يقبله المتصفح.
+"""
+import json
+import mimetypes
+import os
+
+from flask import request, send_from_directory, abort, url_for
+
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+
+class AssetManifest:
+    """المسار الأصلي -> المسار المبني في static/dist"""
+
+    def __init__(self, static_folder, dist='dist'):
+        self.dist = dist
+        self.directory = os.path.join(static_folder, dist)
+        self.manifest = {}
+
+    def load(self):
+        path = os.path.join(self.directory, 'manifest.json')
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        return self.manifest
+
+    def url(self, filename):
+        """المسار داخل static للملف المبني، أو None إذا لم يُبنَ"""
+        built = self.manifest.get(filename)
+        return f"{self.dist}/{built}" if built else None
+
+    def webp(self, filename):
+        """رابط نسخة WebP من صورة، أو None"""
+        built = self.url(filename + '.webp')
+        return url_for('static', filename=built) if built else None
+
+    def rewrite_static_url(self, endpoint, values):
+        if endpoint == 'static':
+            built = self.url(values.get('filename'))
+            if built:
+                values['filename'] = built
+
+    def send(self, filename):
+        """إرسال ملف مبني، بنسخته المضغوطة مسبقاً إن أمكن"""
+        path = os.path.join(self.directory, filename)
+        if not os.path.isfile(path):
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[encoding] > 0 and os.path.isfile(path + suffix):
+                response = send_from_directory(self.directory, filename + suffix,
+                                               mimetype=mimetype, max_age=ASSET_MAX_AGE)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(self.directory, filename, max_age=ASSET_MAX_AGE)
+        response.cache_control.immutable = True
+        response.cache_control.public = True
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def init_app(self, app):
+        self.load()
+        app.url_defaults(self.rewrite_static_url)
+        app.add_url_rule(f"{app.static_url_path}/{self.dist}/<path:filename>",
+                         'built_asset', self.send)
+        app.jinja_env.globals['static_webp'] = self.webp
@@ -0,0 +1,159 @@
+"""تسجيل الحضور من مسح رموز QR
+
+رمز QR الحصة يشير إلى /go/<id> في الموقع، والمسار يحوّل فوراً إلى رابط
+Google Meet الحالي. عند بداية الحصة يمسح مئات الطلاب الرمز في نفس الدقيقة،
+لذلك لا يكتب المسار شيئاً على القرص: record() تضيف المسح إلى قائمة في
+الذاكرة، وخيط خلفي يكتب القائمة دفعة واحدة في SQLite كل flush_interval
+ثانية أو عند امتلائها.
+
+الحصة (session) هي الحصة في يوم معين، والإحصاءات لكل حصة ويوم.
+"""
+import atexit
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from metrics import metrics
+from storage import DATE_FORMAT
+
+
+class AttendanceLog:
+    """مسحات الحضور في ذاكرة العامل ثم في جدول attendance_scans"""
+
+    def __init__(self, path, batch_size=200, flush_interval=2.0, max_buffer=50000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._local = threading.local()
+        self._thread = None
+        self._schema_ready = False
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            if not self._schema_ready:
+                self._init_schema(conn)
+                self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def reopen(self):
+        """ترك اتصالات العملية الأم ومسحاتها بعد fork"""
+        self._local = threading.local()
+        self._buffer = []
+        self._thread = None
+
+    def _init_schema(self, conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS attendance_scans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                schedule_id INTEGER NOT NULL,
+                student_id TEXT,
+                session_date TEXT NOT NULL,
+                scanned_at TEXT NOT NULL
+            )''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_attendance_session '
+                     'ON attendance_scans(session_date, schedule_id)')
+
+    # ==================== Recording ====================
+
+    def record(self, schedule_id, student_id=None):
+        """إضافة مسح إلى الذاكرة فقط، ويوقظ خيط الكتابة إذا اكتملت دفعة"""
+        scanned = time.time()
+        with self._buffer_lock:
+            if len(self._buffer) >= self.max_buffer:
+                # القرص متعطل منذ مدة: نترك الأقدم بدل أن تكبر الذاكرة بلا حد
+                del self._buffer[0]
+                metrics.count('attendance_dropped')
+            self._buffer.append((schedule_id, student_id, scanned))
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def pending(self):
+        return len(self._buffer)
+
+    def flush(self):
+        """كتابة ما في الذاكرة في معاملة واحدة، ويرجع عدد المسحات المكتوبة"""
+        with self._flush_lock:
+            with self._buffer_lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            rows = []
+            for schedule_id, student_id, scanned in batch:
+                scanned = datetime.fromtimestamp(scanned)
+                rows.append((schedule_id, student_id, scanned.strftime('%Y-%m-%d'),
+                             scanned.strftime(DATE_FORMAT)))
+            try:
+                with metrics.span('attendance_flush'):
+                    conn = self._connect()
+                    conn.execute('BEGIN IMMEDIATE')
+                    try:
+                        conn.executemany('INSERT INTO attendance_scans '
+                                         '(schedule_id, student_id, session_date, scanned_at) '
+                                         'VALUES (?, ?, ?, ?)', rows)
+                    except BaseException:
+                        conn.execute('ROLLBACK')
+                        raise
+                    conn.execute('COMMIT')
+            except Exception:
+                # إعادة الدفعة أمام ما وصل أثناء المحاولة، لتُكتب في المرة القادمة
+                with self._buffer_lock:
+                    room = self.max_buffer - len(self._buffer)
+                    self._buffer[:0] = batch[-room:] if room > 0 else []
+                raise
+            metrics.count('attendance_scans', len(batch))
+            return len(batch)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing attendance: {str(e)}")
+
+    def start(self):
+        """تشغيل خيط الكتابة، مرة واحدة لكل عملية"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True, name='attendance-flush')
+        self._thread.start()
+        # ما بقي في الذاكرة عند إيقاف العامل
+        atexit.register(self._flush_at_exit)
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error flushing attendance: {str(e)}")
+
+    # ==================== Aggregates ====================
+
+    def sessions(self, days=30):
+        """لكل حصة ويوم: عدد المسحات والطلاب المعروفين وأول وآخر مسح، الأحدث أولاً"""
+        since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        rows = self._connect().execute('''
+            SELECT schedule_id, session_date, COUNT(*), COUNT(DISTINCT student_id),
+                   MIN(scanned_at), MAX(scanned_at)
+            FROM attendance_scans WHERE session_date >= ?
+            GROUP BY session_date, schedule_id
+            ORDER BY session_date DESC, schedule_id''', (since,)).fetchall()
+        return [{
+            'schedule_id': schedule_id,
+            'date': date,
+            'scans': scans,
+            'students': students,
+            'first_scan': first[11:16],
+            'last_scan': last[11:16],
+        } for schedule_id, date, scans, students, first, last in rows]
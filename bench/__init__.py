@@ -0,0 +1 @@
+"""قياس أداء المسارات الأساسية: python -m bench --help"""
@@ -0,0 +1,353 @@
+"""قياس زمن الاستجابة والإنتاجية والذاكرة للمسارات الأساسية
+
+    python -m bench --students 10000 --requests 300
+    python -m bench --mode gunicorn --workers 4 --concurrency 16 --students 100000
+    python -m bench --students 10000 --save bench/baselines/client-10k.json
+    python -m bench --students 10000 --check bench/baselines/client-10k.json
+
+في وضع client يُستعمل test client الخاص بـ Flask داخل نفس العملية (الذاكرة
+هي ذروة tracemalloc لكل مسار)، وفي وضع gunicorn يُشغّل خادم محلي بإعدادات
+gunicorn.conf.py ويُرسل إليه عملاء متوازيون (الذاكرة هي مجموع RSS للعمليات).
+البيانات تُنشأ في مجلد مؤقت فلا تُلمس بيانات data/ الحقيقية.
+
+--check يقارن بنتائج محفوظة ويخرج برمز 1 إذا ساء مسار بأكثر من --tolerance.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from bench.datasets import build_workdir  # noqa: E402
+
+# فروق أصغر من هذا (بالمللي ثانية) تُعتبر ضجيجاً عند المقارنة
+NOISE_FLOOR_MS = 1.0
+
+
+def route_requests(students, programs):
+    """المسارات المقاسة: الاسم -> دالة ترجع (method, path, body, admin, headers) للطلب رقم i"""
+    rng = random.Random(1)
+    serial = count()
+
+    def register(i):
+        n = next(serial)
+        return 'POST', '/api/register', {
+            'firstName': 'قياس', 'lastName': f'رقم {n}', 'age': '20',
+            'phone': f'0550{n:06d}', 'email': f'bench{n}-{os.getpid()}@bench.dz',
+            'address': 'حي القياس', 'state': 'ورقلة', 'program': programs[n % len(programs)]
+        }, False, {'Idempotency-Key': f'bench-{os.getpid()}-{n:08d}'}
+
+    return {
+        'register': register,
+        'schedule': lambda i: ('GET', f'/schedule/STB{rng.randrange(students):06d}', None, False,
+                                     None),
+        'statistics': lambda i: ('GET', '/api/statistics', None, False, None),
+        'dashboard': lambda i: ('GET', '/admin/dashboard', None, True, None),
+        'students_page': lambda i: ('GET', f'/admin/api/students?page={rng.randint(1, 20)}'
+                                           f'&sort={rng.choice(["name", "date", "age"])}',
+                                    None, True, None),
+        'join': lambda i: ('GET', f'/go/{rng.randint(1, 6)}/STB{rng.randrange(students):06d}',
+                           None, False, None),
+        'qr': lambda i: ('GET', f'/qr/{rng.randint(1, 6)}.{rng.choice(["png", "svg"])}'
+                                f'?size={rng.randint(2, 20)}', None, False, None),
+    }
+
+
+def client_address(i):
+    """عنوان مختلف لكل طلب، كأن كل طلب من زائر مختلف (حد الطلبات لكل عميل)"""
+    return f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}'
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(latencies, errors, elapsed, peak_mb):
+    ms = [latency * 1000 for latency in latencies] or [0]
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0,
+        'p50': round(percentile(ms, 50), 2),
+        'p90': round(percentile(ms, 90), 2),
+        'p99': round(percentile(ms, 99), 2),
+        'max': round(max(ms), 2),
+        'peak_mb': round(peak_mb, 1),
+    }
+
+
+# ==================== Test Client ====================
+
+def run_client(routes, requests_per_route):
+    import app as application
+    application.init_app()
+    client = application.app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+
+    results = {}
+    for name, make_request in routes.items():
+        latencies, errors = [], 0
+        tracemalloc.start()
+        started = time.perf_counter()
+        for i in range(requests_per_route):
+            method, path, body, _, headers = make_request(i)
+            t = time.perf_counter()
+            response = client.open(path, method=method, json=body, headers=headers,
+                                   environ_base={'REMOTE_ADDR': client_address(i)})
+            response.get_data()
+            latencies.append(time.perf_counter() - t)
+            errors += response.status_code >= 400
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+        results[name] = summarize(latencies, errors, elapsed, peak)
+    # مسحات الحضور في الذاكرة تُكتب قبل حذف مجلد العمل
+    application.attendance_log.flush()
+    return results
+
+
+# ==================== Gunicorn ====================
+
+def _process_tree(pid):
+    pids = [pid]
+    for p in pids:
+        try:
+            with open(f'/proc/{p}/task/{p}/children') as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def _rss_mb(pids):
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total / 1024
+
+
+class MemorySampler(threading.Thread):
+    """أعلى مجموع RSS لشجرة عمليات الخادم أثناء القياس (لينكس فقط)"""
+
+    def __init__(self, pid, interval=0.05):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0.0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            self.peak = max(self.peak, _rss_mb(_process_tree(self.pid)))
+            self._done.wait(self.interval)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        return self.peak
+
+
+def _http(port, method, path, body=None, cookie=None, client=None, timeout=60, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    headers = dict(headers or {}, **{'Accept-Encoding': 'gzip'})
+    if client:
+        headers['X-Forwarded-For'] = client
+    payload = None
+    if body is not None:
+        payload = json.dumps(body).encode('utf-8')
+        headers['Content-Type'] = 'application/json'
+    if cookie:
+        headers['Cookie'] = cookie
+    try:
+        conn.request(method, path, body=payload, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        return response.status, response.getheader('Set-Cookie')
+    finally:
+        conn.close()
+
+
+def start_gunicorn(workdir, port, workers):
+    # PROXY_COUNT=1 حتى يأخذ التطبيق عنوان العميل من X-Forwarded-For
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, WEB_CONCURRENCY=str(workers), PROXY_COUNT='1')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(REPO_DIR, 'gunicorn.conf.py'),
+         '--bind', f'127.0.0.1:{port}', 'app:app'],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            _http(port, 'GET', '/api/programs', timeout=2)
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError('gunicorn exited during startup')
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start in time')
+
+
+def run_gunicorn(routes, requests_per_route, workdir, port, workers, concurrency):
+    process = start_gunicorn(workdir, port, workers)
+    try:
+        from app import ADMIN_USERNAME, ADMIN_PASSWORD
+        _, cookie = _http(port, 'POST', '/admin/login',
+                          {'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD})
+        cookie = cookie.split(';', 1)[0] if cookie else None
+
+        results = {}
+        for name, make_request in routes.items():
+            planned = [(i, make_request(i)) for i in range(requests_per_route)]
+
+            def send(planned_request):
+                i, (method, path, body, admin, headers) = planned_request
+                t = time.perf_counter()
+                try:
+                    status, _ = _http(port, method, path, body, cookie if admin else None,
+                                      client_address(i), headers=headers)
+                except OSError:
+                    status = 599
+                return time.perf_counter() - t, status
+
+            sampler = MemorySampler(process.pid)
+            sampler.start()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as pool:
+                outcomes = list(pool.map(send, planned))
+            elapsed = time.perf_counter() - started
+            results[name] = summarize([latency for latency, _ in outcomes],
+                                      sum(status >= 400 for _, status in outcomes),
+                                      elapsed, sampler.stop())
+        return results
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+# ==================== Baselines ====================
+
+def compare(results, baseline, tolerance):
+    """قائمة التراجعات مقارنة بالنتائج المحفوظة"""
+    regressions = []
+    for name, base in baseline['results'].items():
+        current = results.get(name)
+        if current is None:
+            continue
+        for metric in ('p50', 'p99'):
+            limit = base[metric] * (1 + tolerance)
+            if current[metric] > limit and current[metric] - base[metric] > NOISE_FLOOR_MS:
+                regressions.append(f"{name}: {metric} {current[metric]} ms > {base[metric]} ms")
+        if base['rps'] and current['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: rps {current['rps']} < {base['rps']}")
+        if current['errors'] > base['errors']:
+            regressions.append(f"{name}: errors {current['errors']} > {base['errors']}")
+    return regressions
+
+
+def print_table(results):
+    columns = ['requests', 'errors', 'rps', 'p50', 'p90', 'p99', 'max', 'peak_mb']
+    print(f"{'route':<15}" + ''.join(f'{c:>10}' for c in columns))
+    for name, row in results.items():
+        print(f'{name:<15}' + ''.join(f'{row[c]:>10}' for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['client', 'gunicorn'], default='client')
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--contacts', type=int, default=None,
+                        help='عدد الرسائل (افتراضياً عُشر عدد الطلاب)')
+    parser.add_argument('--backend', choices=['sqlite', 'excel'], default='sqlite')
+    parser.add_argument('--requests', type=int, default=200, help='طلبات لكل مسار')
+    parser.add_argument('--routes', help='مسارات مفصولة بفواصل (افتراضياً الكل)')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--port', type=int, default=8799)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help='حفظ النتائج كخط أساس في هذا الملف')
+    parser.add_argument('--check', help='المقارنة بخط أساس محفوظ')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--keep', action='store_true', help='إبقاء مجلد العمل المؤقت')
+    args = parser.parse_args()
+
+    os.environ['STORAGE_BACKEND'] = args.backend
+    from app import PROGRAMS
+    programs = [p['id'] for p in PROGRAMS]
+    contacts = args.students // 10 if args.contacts is None else args.contacts
+
+    workdir = tempfile.mkdtemp(prefix='zawiya-bench-')
+    try:
+        started = time.perf_counter()
+        build_workdir(workdir, args.students, contacts, programs, args.backend, args.seed)
+        print(f'dataset: {args.students} students, {contacts} contacts '
+              f'({time.perf_counter() - started:.1f}s) in {workdir}')
+
+        routes = route_requests(args.students, programs)
+        if args.routes:
+            routes = {name: routes[name] for name in args.routes.split(',')}
+
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            if args.mode == 'client':
+                results = run_client(routes, args.requests)
+            else:
+                results = run_gunicorn(routes, args.requests, workdir, args.port,
+                                       args.workers, args.concurrency)
+        finally:
+            os.chdir(cwd)
+    finally:
+        if args.keep:
+            print(f'workdir kept: {workdir}')
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(results)
+    config = {key: getattr(args, key) for key in
+              ('mode', 'students', 'backend', 'requests', 'workers', 'concurrency')}
+    config['contacts'] = contacts
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'config': config, 'results': results}, f, indent=2)
+        print(f'baseline saved: {args.save}')
+
+    if args.check:
+        with open(args.check, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline['config'] != config:
+            print(f"warning: baseline config differs: {baseline['config']}")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            return 1
+        print('no regressions')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""بيانات اصطناعية للقياس: طلاب ورسائل بأحجام قابلة للتعديل
+
+البيانات تُكتب في مجلد عمل مستقل (data/ وstatic/qrcodes) بنفس صيغ التطبيق،
+وبنفس البذرة تخرج نفس البيانات في كل مرة.
+"""
+import os
+import random
+from datetime import datetime, timedelta
+
+from inbox import ContactInbox
+from storage import SQLiteStudentStore, DATE_FORMAT, create_store
+
+FIRST_NAMES = ['محمد', 'أحمد', 'عبد الرحمان', 'يوسف', 'إبراهيم', 'عمر', 'فاطمة', 'عائشة',
+               'مريم', 'خديجة', 'زينب', 'سارة', 'إسحاق', 'حمزة', 'أمينة', 'نور الهدى']
+LAST_NAMES = ['التجاني', 'بن عمر', 'قادير', 'الصالحي', 'بلحاج', 'قزوز', 'بوعلام',
+              'مسعودي', 'العيد', 'بن ناصر', 'حمادي', 'زروقي']
+STATES = ['ورقلة', 'الجزائر', 'تقرت', 'الأغواط', 'بسكرة', 'الوادي', 'غرداية', 'تيارت',
+          'بشار', 'تبسة', 'البويرة', 'وهران', 'قسنطينة', 'سطيف']
+STATUSES = ['نشط'] * 8 + ['متوقف', 'متخرج']
+SUBJECTS = ['استفسار عن التسجيل', 'مشكلة في رابط الحصة', 'طلب تغيير البرنامج',
+            'سؤال عن المواعيد', 'شكر وتقدير', 'مشكلة تقنية في الصوت']
+MESSAGES = ['السلام عليكم، أرجو إفادتي بمواعيد الحصص القادمة',
+            'لم أتمكن من الدخول إلى الحصة عبر الرابط المرسل',
+            'أريد تسجيل ابني في برنامج الأطفال بدل برنامج الكبار',
+            'بارك الله فيكم على المجهود، الحصص مفيدة جداً',
+            'الصوت ينقطع أثناء الدرس، هل من حل؟']
+
+
+def synth_students(count, programs, seed=0, days=365):
+    """count سجل طالب بمعرفات ثابتة STB000001... وتواريخ على آخر days يوماً"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    for i in range(count):
+        registered = now - timedelta(seconds=rng.randrange(days * 24 * 3600))
+        yield {
+            'معرف فريد': f'STB{i:06d}',
+            'الاسم': rng.choice(FIRST_NAMES),
+            'اللقب': rng.choice(LAST_NAMES),
+            'العمر': rng.randint(6, 70),
+            'الجنس': rng.choice(['ذكر', 'أنثى']),
+            'مكان الإقامة': f'حي {rng.randint(1, 300)}',
+            'الولاية': rng.choice(STATES),
+            'رقم الهاتف': f'0{rng.choice("567")}{rng.randrange(10 ** 8):08d}',
+            'البريد الإلكتروني': f'student{i}@bench.dz',
+            'البرنامج المختار': rng.choice(programs),
+            'تاريخ التسجيل': registered.strftime(DATE_FORMAT),
+            'الحالة': rng.choice(STATUSES),
+        }
+
+
+def synth_contacts(count, seed=0, days=365):
+    rng = random.Random(seed + 1)
+    now = datetime.now()
+    for i in range(count):
+        sent = now - timedelta(seconds=rng.randrange(days * 24 * 3600))
+        yield {
+            'الاسم': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'البريد الإلكتروني': f'contact{i}@bench.dz',
+            'رقم الهاتف': f'0{rng.choice("567")}{rng.randrange(10 ** 8):08d}',
+            'الموضوع': rng.choice(SUBJECTS),
+            'الرسالة': rng.choice(MESSAGES),
+            'التاريخ': sent.strftime(DATE_FORMAT),
+            'الحالة': 'جديدة',
+        }
+
+
+def build_workdir(workdir, students, contacts, programs, backend='sqlite', seed=0,
+                  batch_size=5000):
+    """إنشاء مجلد عمل بالبيانات بنفس المسارات التي يستعملها app.py"""
+    data_dir = os.path.join(workdir, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(os.path.join(workdir, 'static', 'qrcodes'), exist_ok=True)
+
+    if backend == 'excel':
+        store = create_store('excel', path=os.path.join(data_dir, 'students.xlsx'))
+    else:
+        store = SQLiteStudentStore(os.path.join(data_dir, 'school.db'))
+    batch = []
+    for record in synth_students(students, programs, seed):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            store.add_many(batch)
+            batch = []
+    if batch:
+        store.add_many(batch)
+
+    inbox = ContactInbox(os.path.join(data_dir, 'contacts'))
+    inbox.append_many(sorted(synth_contacts(contacts, seed), key=lambda r: r['التاريخ']))
+    return workdir
@@ -0,0 +1,199 @@
+"""بناء ملفات static للإنتاج: python build_assets.py
+
+ينتج في static/dist (دون اتصال بالإنترنت):
+- CSS وJS مصغرة بأسماء تحمل بصمة محتواها (style.3f2a9c1b.css)
+- نسخ .gz و.br (إن كانت مكتبة brotli مثبتة) بجانب كل ملف نصي
+- صور مصغرة إلى عرض أقصى ونسخ WebP منها
+- manifest.json: المسار الأصلي -> المسار المبني، يستعمله assets.py
+
+الملفات المبنية لا تتغير أبداً بنفس الاسم، فتُرسل بترويسة immutable.
+أعد تشغيل البناء بعد أي تعديل في static ثم أعد تشغيل التطبيق.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = 'static'
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_FILE = os.path.join(DIST_DIR, 'manifest.json')
+
+# مجلدات static التي تُبنى (رموز QR والملفات المرفوعة تبقى كما هي)
+SOURCES = ['css', 'js', 'images']
+TEXT_EXTENSIONS = {'.css', '.js', '.svg'}
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+IMAGE_MAX_WIDTH = 1200
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+_STRINGS = re.compile(r'''("(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')''')
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def minify_css(text):
+    """إزالة التعليقات والمسافات الزائدة خارج النصوص المقتبسة"""
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    parts = _STRINGS.split(text)
+    for i in range(0, len(parts), 2):
+        part = re.sub(r'\s+', ' ', parts[i])
+        part = re.sub(r'\s*([{};:,>])\s*', r'\1', part)
+        parts[i] = part.replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def minify_js(text):
+    """تصغير محافظ: حذف المسافات البادئة والأسطر الفارغة وأسطر التعليقات
+
+    لا يُلمس ما داخل قوالب النصوص (`...`). إذا كانت rjsmin مثبتة تُستعمل بدلاً
+    من ذلك.
+    """
+    try:
+        import rjsmin
+    except ImportError:
+        rjsmin = None
+    if rjsmin is not None:
+        return rjsmin.jsmin(text)
+
+    lines = []
+    in_template = in_comment = False
+    for line in text.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if in_comment:
+                in_comment = '*/' not in stripped
+                continue
+            if stripped.startswith('/*'):
+                in_comment = '*/' not in stripped
+                continue
+            if not stripped or stripped.startswith('//'):
+                continue
+            lines.append(stripped)
+        if _STRINGS.sub('', line).count('`') % 2:
+            in_template = not in_template
+    return '\n'.join(lines)
+
+
+def hashed_name(relative, data, extension=None):
+    root, ext = os.path.splitext(relative)
+    return f"{root}.{content_hash(data)}{extension or ext}"
+
+
+def write_output(relative, data):
+    path = os.path.join(DIST_DIR, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    if os.path.splitext(relative)[1] in TEXT_EXTENSIONS:
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data))
+
+
+def build_text(relative, source):
+    with open(source, encoding='utf-8') as f:
+        text = f.read()
+    ext = os.path.splitext(relative)[1]
+    if ext == '.css':
+        text = minify_css(text)
+    elif ext == '.js':
+        text = minify_js(text)
+    data = text.encode('utf-8')
+    output = hashed_name(relative, data)
+    write_output(output, data)
+    return {relative: output}
+
+
+def build_image(relative, source):
+    """الصورة بعرض أقصى IMAGE_MAX_WIDTH مع نسخة WebP إن كانت أصغر
+
+    نسخة WebP تُسجل في manifest باسم الصورة الأصلية مضافاً إليه .webp.
+    """
+    from io import BytesIO
+    from PIL import Image
+
+    entries = {}
+    with Image.open(source) as img:
+        ext = os.path.splitext(relative)[1].lower()
+        if img.width > IMAGE_MAX_WIDTH:
+            img = img.resize((IMAGE_MAX_WIDTH, round(img.height * IMAGE_MAX_WIDTH / img.width)),
+                             Image.LANCZOS)
+            output = BytesIO()
+            if ext == '.png':
+                img.save(output, 'PNG', optimize=True)
+            else:
+                img.convert('RGB').save(output, 'JPEG', quality=JPEG_QUALITY,
+                                        optimize=True, progressive=True)
+            data = output.getvalue()
+        else:
+            with open(source, 'rb') as f:
+                data = f.read()
+        name = hashed_name(relative, data)
+        write_output(name, data)
+        entries[relative] = name
+
+        output = BytesIO()
+        webp = img if img.mode in ('RGB', 'RGBA') else img.convert('RGBA')
+        webp.save(output, 'WEBP', quality=WEBP_QUALITY, method=6)
+        if output.tell() < len(data):
+            data = output.getvalue()
+            name = hashed_name(relative, data, '.webp')
+            write_output(name, data)
+            entries[relative + '.webp'] = name
+    return entries
+
+
+def build():
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    os.makedirs(DIST_DIR)
+    manifest = {}
+    for folder in SOURCES:
+        for root, _, files in os.walk(os.path.join(STATIC_DIR, folder)):
+            for name in sorted(files):
+                source = os.path.join(root, name)
+                relative = os.path.relpath(source, STATIC_DIR).replace(os.sep, '/')
+                ext = os.path.splitext(name)[1].lower()
+                if ext in TEXT_EXTENSIONS:
+                    manifest.update(build_text(relative, source))
+                elif ext in IMAGE_EXTENSIONS:
+                    manifest.update(build_image(relative, source))
+                else:
+                    with open(source, 'rb') as f:
+                        data = f.read()
+                    output = hashed_name(relative, data)
+                    write_output(output, data)
+                    manifest[relative] = output
+    with open(MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def _size(relative):
+    return os.path.getsize(os.path.join(STATIC_DIR, relative))
+
+
+if __name__ == '__main__':
+    manifest = build()
+    for original, built in sorted(manifest.items()):
+        source_size = _size(original) if os.path.exists(os.path.join(STATIC_DIR, original)) else None
+        built_size = os.path.getsize(os.path.join(DIST_DIR, built))
+        gz = os.path.join(DIST_DIR, built + '.gz')
+        extra = f", gzip {os.path.getsize(gz):,}" if os.path.exists(gz) else ''
+        before = f"{source_size:,} -> " if source_size is not None else ''
+        print(f"{original}: {before}{built_size:,} bytes{extra}")
+    print(f"{len(manifest)} assets -> {MANIFEST_FILE}"
+          + ('' if brotli else ' (brotli not installed, .br skipped)'))
@@ -0,0 +1,62 @@
+"""فحص زمن استيراد التطبيق: python check_startup.py [--budget 0.8]
+
+يستورد app في عملية جديدة عدة مرات ويأخذ أفضل زمن، ويفشل (رمز خروج 1) إذا
+تجاوز الميزانية أو إذا حُمّلت مكتبة ثقيلة عند الاستيراد أو كُتب ملف في data.
+الميزانية الافتراضية من IMPORT_BUDGET (بالثواني).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# مكتبات يجب ألا تُحمّل إلا عند الحاجة إليها
+HEAVY_MODULES = ['pandas', 'openpyxl', 'qrcode', 'PIL', 'pyarrow']
+
+PROBE = '''
+import json, os, sys, time
+before = set(os.listdir('data')) if os.path.isdir('data') else None
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+after = set(os.listdir('data')) if os.path.isdir('data') else None
+print(json.dumps({
+    'seconds': elapsed,
+    'heavy': [m for m in %r if m in sys.modules],
+    'created': sorted((after or set()) - (before or set())) if after != before else [],
+}))
+''' % HEAVY_MODULES
+
+
+def measure(runs):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], capture_output=True,
+                                text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return min(results, key=lambda r: r['seconds'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--budget', type=float,
+                        default=float(os.environ.get('IMPORT_BUDGET', 0.8)))
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    print(f"import app: {result['seconds'] * 1000:.0f} ms (budget {args.budget * 1000:.0f} ms)")
+    failures = []
+    if result['seconds'] > args.budget:
+        failures.append('over budget')
+    if result['heavy']:
+        failures.append(f"heavy modules imported: {', '.join(result['heavy'])}")
+    if result['created']:
+        failures.append(f"files created at import: {', '.join(result['created'])}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
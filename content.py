@@ -0,0 +1,171 @@
+"""محتوى الموقع المشترك بين العمال: البرامج وجدول الحصص والهيكل التنظيمي
+
+المحتوى يُحفظ كوثائق JSON في SQLite مع رقم نسخة يزيد مع كل تعديل. كل عامل
+يحتفظ بنسخة في الذاكرة ويقارن رقمها برقم القاعدة في بداية كل طلب (استعلام
+واحد صغير)، ويُعيد التحميل فقط إذا تغير، فيرى كل العمال تعديل رابط حصة من
+الطلب التالي ويبقى التعديل بعد إعادة التشغيل.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ContentStore:
+    """وثائق JSON بأسماء ثابتة مع رقم نسخة عام"""
+
+    def __init__(self, path, defaults, legacy_path=None):
+        self.path = path
+        self._local = threading.local()
+        self._init_schema(defaults, legacy_path)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def reopen(self):
+        """ترك اتصالات العملية الأم بعد fork"""
+        self._local = threading.local()
+
+    def _init_schema(self, defaults, legacy_path=None):
+        """إنشاء الجداول وإدخال المحتوى الأولي للوثائق غير الموجودة
+
+        legacy_path قاعدة قديمة كان المحتوى فيها (school.db): وثائقها ورقم
+        نسختها تُنقل قبل المحتوى الأولي حتى لا تضيع التعديلات السابقة.
+        """
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS content (
+                name TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS content_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )''')
+        documents, version = self._legacy_content(legacy_path)
+        with self._transaction() as conn:
+            conn.execute('INSERT OR IGNORE INTO content_version (id, version) VALUES (1, ?)',
+                         (version,))
+            for name, data, updated_at in documents:
+                conn.execute('INSERT OR IGNORE INTO content (name, data, updated_at) '
+                             'VALUES (?, ?, ?)', (name, data, updated_at))
+            for name, data in defaults.items():
+                conn.execute('INSERT OR IGNORE INTO content (name, data, updated_at) '
+                             'VALUES (?, ?, ?)',
+                             (name, json.dumps(data, ensure_ascii=False), time.time()))
+
+    @staticmethod
+    def _legacy_content(legacy_path):
+        """(الوثائق، رقم النسخة) من القاعدة القديمة، أو ([]، 1) إن لم تكن"""
+        if not legacy_path or not os.path.exists(legacy_path):
+            return [], 1
+        conn = sqlite3.connect(f'file:{legacy_path}?mode=ro', uri=True, timeout=30)
+        try:
+            documents = conn.execute('SELECT name, data, updated_at FROM content').fetchall()
+            version = conn.execute('SELECT version FROM content_version WHERE id = 1').fetchone()
+        except sqlite3.OperationalError:
+            # القاعدة القديمة بلا جداول محتوى
+            return [], 1
+        finally:
+            conn.close()
+        return documents, version[0] if version else 1
+
+    @contextmanager
+    def _transaction(self):
+        """معاملة تأخذ قفل الكتابة من بدايتها"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def version(self):
+        return self._connect().execute(
+            'SELECT version FROM content_version WHERE id = 1').fetchone()[0]
+
+    def load(self):
+        """(رقم النسخة، {الاسم: البيانات}) من قراءة واحدة متسقة"""
+        conn = self._connect()
+        conn.execute('BEGIN')
+        try:
+            version = conn.execute(
+                'SELECT version FROM content_version WHERE id = 1').fetchone()[0]
+            documents = {name: json.loads(data)
+                         for name, data in conn.execute('SELECT name, data FROM content')}
+        finally:
+            conn.execute('COMMIT')
+        return version, documents
+
+    def modify(self, name, change):
+        """تعديل وثيقة بدالة change(data) داخل معاملة واحدة
+
+        change تعدّل البيانات في مكانها وترجع قيمة تُعاد للمستدعي؛ إذا
+        رفعت استثناءً لا يُحفظ شيء. يرجع (رقم النسخة الجديد، القيمة).
+        """
+        with self._transaction() as conn:
+            row = conn.execute('SELECT data FROM content WHERE name = ?', (name,)).fetchone()
+            data = json.loads(row[0]) if row else None
+            result = change(data)
+            conn.execute('INSERT OR REPLACE INTO content (name, data, updated_at) '
+                         'VALUES (?, ?, ?)',
+                         (name, json.dumps(data, ensure_ascii=False), time.time()))
+            conn.execute('UPDATE content_version SET version = version + 1 WHERE id = 1')
+            version = conn.execute(
+                'SELECT version FROM content_version WHERE id = 1').fetchone()[0]
+        return version, result
+
+
+class SiteContent:
+    """نسخة العامل من المحتوى، تُحدّث عند تغير رقم النسخة في القاعدة
+
+    الدوال المسجلة عبر on_reload تُستدعى بعد كل تحميل (إعادة بناء جداول
+    البرامج مثلاً). الحالة كلها تُستبدل دفعة واحدة.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.version = None
+        self.documents = {}
+
+    def on_reload(self, listener):
+        self._listeners.append(listener)
+        return listener
+
+    def refresh(self):
+        """إعادة التحميل إذا تغير رقم النسخة، ويرجع رقم النسخة الحالي"""
+        version = self.store.version()
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    self._reload()
+        return self.version
+
+    def _reload(self):
+        version, documents = self.store.load()
+        self.documents = documents
+        for listener in self._listeners:
+            listener(self)
+        self.version = version
+
+    def modify(self, name, change):
+        """تعديل وثيقة في القاعدة ثم تحميلها هنا فوراً"""
+        _, result = self.store.modify(name, change)
+        self.refresh()
+        return result
+
+    def __getitem__(self, name):
+        return self.documents[name]
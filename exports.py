@@ -0,0 +1,102 @@
+"""تصدير بيانات الطلاب بالتدفق
+
+الصفوف تأتي من مولّد وتُكتب تدريجياً، فلا يُحمّل الجدول كله في الذاكرة مهما
+كبر، ويبدأ التحميل في CSV فور وصول أول دفعة.
+"""
+import csv
+import os
+import tempfile
+from io import StringIO
+
+EXPORT_MIMETYPES = {
+    # Flask يضيف charset=utf-8 لأنواع text/ بنفسه
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+CHUNK_ROWS = 500
+CHUNK_BYTES = 64 * 1024
+
+
+def _row(record, columns):
+    return [record.get(column) for column in columns]
+
+
+def stream_csv(records, columns):
+    """مولّد لنص CSV على دفعات (مع BOM حتى يفتحه Excel بالعربية)"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    for i, record in enumerate(records, 1):
+        writer.writerow(_row(record, columns))
+        if i % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_file(path):
+    """قراءة ملف مؤقت على دفعات ثم حذفه"""
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def _temp_path(suffix):
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    return path
+
+
+def write_xlsx(records, columns):
+    """كتابة ملف xlsx بوضع write_only (ذاكرة ثابتة) وإرجاع مساره المؤقت"""
+    from openpyxl import Workbook
+    path = _temp_path('.xlsx')
+    try:
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(columns)
+        for record in records:
+            ws.append(_row(record, columns))
+        wb.save(path)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def write_parquet(records, columns, batch_size=5000):
+    """كتابة ملف Parquet على دفعات، يتطلب pyarrow"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    path = _temp_path('.parquet')
+    try:
+        with pq.ParquetWriter(path, schema) as writer:
+            batch = []
+            for record in records:
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    writer.write_table(_parquet_table(pa, batch, columns, schema))
+                    batch = []
+            if batch:
+                writer.write_table(_parquet_table(pa, batch, columns, schema))
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def _parquet_table(pa, batch, columns, schema):
+    data = {column: [None if r.get(column) is None else str(r.get(column)) for r in batch]
+            for column in columns}
+    return pa.Table.from_pydict(data, schema=schema)
@@ -0,0 +1,20 @@
+"""إعدادات gunicorn: العمال يتفرعون من عملية أم حمّلت التطبيق والبيانات
+
+عدد العمال والمنفذ من WEB_CONCURRENCY وPORT كما يقرؤهما gunicorn افتراضياً.
+PRELOAD=0 يعطّل التحميل المسبق (كل عامل يهيئ نفسه).
+"""
+import os
+
+preload_app = os.environ.get('PRELOAD', '1') != '0'
+
+
+def when_ready(server):
+    if preload_app:
+        import app
+        # الملفات والنسخ المفهرسة تُحمّل مرة في الأم، دون خيوط ولا اتصالات للعمال
+        app.init_app(start_background=False)
+
+
+def post_fork(server, worker):
+    import app
+    app.after_fork()
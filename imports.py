@@ -0,0 +1,105 @@
+"""استيراد الطلاب دفعة واحدة من ملف XLSX أو CSV
+
+الملف يُقرأ كجدول pandas ويُتحقق منه عموداً عموداً (الحقول المطلوبة، العمر،
+الإيميل، البرنامج، التكرار داخل الملف) بدل التحقق سطراً سطراً، ثم تُكتب
+الأسطر الصالحة كلها في المحرك بكتابة واحدة. الأسطر المرفوضة تُرجع مع رقمها
+في الملف وأسباب رفضها.
+"""
+import os
+import uuid
+from datetime import datetime
+
+from storage import DATE_FORMAT, ACTIVE_STATUS, EMAIL_PATTERN
+
+# أسماء حقول نموذج التسجيل -> أعمدة الطلاب، فيقبل الملف أياً منهما
+FORM_COLUMNS = {
+    'firstName': 'الاسم',
+    'lastName': 'اللقب',
+    'age': 'العمر',
+    'gender': 'الجنس',
+    'address': 'مكان الإقامة',
+    'state': 'الولاية',
+    'phone': 'رقم الهاتف',
+    'email': 'البريد الإلكتروني',
+    'program': 'البرنامج المختار',
+}
+
+IMPORT_COLUMNS = list(FORM_COLUMNS.values())
+IMPORT_EXTENSIONS = {'.xlsx', '.csv'}
+
+MIN_AGE, MAX_AGE = 3, 120
+
+
+def new_student_id():
+    return 'STD' + str(uuid.uuid4())[:8].upper()
+
+
+def read_table(stream, filename):
+    """قراءة ملف مرفوع كـ DataFrame نصي بأسماء أعمدة الطلاب"""
+    import pandas as pd
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        df = pd.read_csv(stream, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+    elif extension == '.xlsx':
+        df = pd.read_excel(stream, dtype=str, keep_default_na=False, engine='openpyxl')
+    else:
+        raise ValueError(f'صيغة غير مدعومة: {extension or filename}')
+    df.columns = [str(column).strip() for column in df.columns]
+    return df.rename(columns=FORM_COLUMNS)
+
+
+def validate_students(df, required, programs):
+    """التحقق من كل الأسطر معاً: (السجلات الصالحة، أخطاء الأسطر المرفوضة)
+
+    required أسماء حقول النموذج المطلوبة (كما في /api/register) وprograms
+    معرفات البرامج المقبولة. رقم السطر في الأخطاء هو رقمه في الملف (الرأس
+    هو السطر 1).
+    """
+    import pandas as pd
+    df = df.reindex(columns=IMPORT_COLUMNS).fillna('').astype(str)
+    df = df.apply(lambda column: column.str.strip())
+
+    checks = []
+    for field in required:
+        column = FORM_COLUMNS[field]
+        checks.append((df[column] == '', f'الحقل {field} مطلوب'))
+
+    ages = pd.to_numeric(df['العمر'], errors='coerce')
+    checks.append(((df['العمر'] != '') & ~ages.between(MIN_AGE, MAX_AGE),
+                   f'العمر يجب أن يكون بين {MIN_AGE} و{MAX_AGE}'))
+
+    emails = df['البريد الإلكتروني'].str.lower()
+    checks.append(((emails != '') & ~emails.str.match(EMAIL_PATTERN.pattern),
+                   'البريد الإلكتروني غير صالح'))
+
+    checks.append(((df['البرنامج المختار'] != '') & ~df['البرنامج المختار'].isin(programs),
+                   'البرنامج غير موجود'))
+
+    checks.append(((emails != '') & pd.DataFrame({'e': emails, 'p': df['البرنامج المختار']})
+                   .duplicated(keep='first'),
+                   'الطالب مكرر في الملف (نفس الإيميل والبرنامج)'))
+
+    invalid = pd.Series(False, index=df.index)
+    for mask, _ in checks:
+        invalid |= mask
+
+    errors = []
+    for index in df.index[invalid]:
+        errors.append({
+            'row': int(index) + 2,
+            'errors': [message for mask, message in checks if mask[index]]
+        })
+
+    valid = df[~invalid]
+    now = datetime.now().strftime(DATE_FORMAT)
+    records = []
+    for row, age in zip(valid.to_dict('records'), ages[~invalid]):
+        row['العمر'] = int(age) if pd.notna(age) else None
+        row['الجنس'] = row['الجنس'] or 'غير محدد'
+        row.update({
+            'معرف فريد': new_student_id(),
+            'تاريخ التسجيل': now,
+            'الحالة': ACTIVE_STATUS,
+        })
+        records.append(row)
+    return records, errors
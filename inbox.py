@@ -0,0 +1,321 @@
+"""رسائل الاتصال في ملفات شهرية
+
+كل شهر ملف JSON-lines في data/contacts (مثل 2026-10.jsonl): الرسالة الجديدة
+سطر يُضاف إلى ملف شهرها فقط، وتغيير الحالة سطر تعديل في نفس الملف. كل
+عامل يقرأ من كل ملف الأسطر الجديدة فقط منذ آخر قراءة.
+
+الأشهر الأقدم من hot_months تُطوى (تُطبق أسطر التعديل) وتُضغط في
+archive/، فلا تبقى في الذاكرة ولا في القراءة اليومية وتُفتح عند الطلب فقط.
+"""
+import gzip
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+from storage import UPDATE_MARKER, DATE_FORMAT, file_lock, atomic_write
+
+NEW_STATUS = 'جديدة'
+
+# الحالة -> الحالات التي يمكن الانتقال إليها
+MESSAGE_TRANSITIONS = {
+    'جديدة': ['مقروءة', 'تم الرد', 'مغلقة'],
+    'مقروءة': ['جديدة', 'تم الرد', 'مغلقة'],
+    'تم الرد': ['مقروءة', 'مغلقة'],
+    'مغلقة': ['مقروءة'],
+}
+MESSAGE_STATUSES = list(MESSAGE_TRANSITIONS)
+
+SEGMENT_PATTERN = re.compile(r'^(\d{4}-\d{2})\.jsonl$')
+ARCHIVE_PATTERN = re.compile(r'^(\d{4}-\d{2})\.jsonl\.gz$')
+
+
+def month_of(record):
+    """الشهر YYYY-MM من تاريخ الرسالة"""
+    date = str(record.get('التاريخ') or '')
+    return date[:7] if re.match(r'^\d{4}-\d{2}', date) else datetime.now().strftime('%Y-%m')
+
+
+def month_of_id(message_id):
+    """'202610-5' -> '2026-10'"""
+    prefix = str(message_id).split('-', 1)[0]
+    return f'{prefix[:4]}-{prefix[4:6]}'
+
+
+def _shift_month(month, delta):
+    year, number = map(int, month.split('-'))
+    index = year * 12 + number - 1 + delta
+    return f'{index // 12:04d}-{index % 12 + 1:02d}'
+
+
+class Segment:
+    """رسائل ملف شهر واحد في الذاكرة، تُحدّث بقراءة ما أُضيف للملف فقط"""
+
+    def __init__(self, path):
+        self.path = path
+        self.messages = {}
+        self.updates = 0
+        self._position = (None, 0)
+
+    def refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.messages, self.updates, self._position = {}, 0, (None, 0)
+            return
+        inode, offset = self._position
+        if stat.st_ino != inode or stat.st_size < offset:
+            # الملف استُبدل (طي أو أرشفة): قراءة من البداية
+            self.messages, self.updates, offset = {}, 0, 0
+        if stat.st_size > offset:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                data = f.read(stat.st_size - offset)
+            # السطر الأخير قد يكون قيد الكتابة من عامل آخر
+            complete = data.rfind(b'\n') + 1
+            for line in data[:complete].splitlines():
+                self._apply(line)
+            offset += complete
+        self._position = (stat.st_ino, offset)
+
+    def _apply(self, line):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # سطر مبتور من توقف مفاجئ أثناء الكتابة
+            return
+        if UPDATE_MARKER in entry:
+            self.updates += 1
+            target = self.messages.get(entry.pop(UPDATE_MARKER))
+            if target is not None:
+                target.update(entry)
+        else:
+            self.messages[entry['رقم']] = entry
+
+
+def _write_lines(path, lines):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(lines)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _dump(records):
+    return ''.join(json.dumps(record, ensure_ascii=False, default=str) + '\n'
+                   for record in records)
+
+
+class ContactInbox:
+    """صندوق رسائل الاتصال: ملف لكل شهر، والأشهر القديمة في أرشيف مضغوط
+
+    الكتابة تحت قفل بين العمليات على ملف inbox.lock في المجلد، والترقيم
+    (202610-1، 202610-2...) لكل شهر على حدة.
+    """
+
+    def __init__(self, directory, hot_months=6, compact_updates=200):
+        self.directory = directory
+        self.archive_directory = os.path.join(directory, 'archive')
+        self.hot_months = hot_months
+        self.compact_updates = compact_updates
+        # للتوافق مع Compactor
+        self.path = directory
+        self.pending = 0
+        self._lock_path = os.path.join(directory, 'inbox')
+        self._segments = {}
+        self._lock = threading.RLock()
+
+    def _segment_path(self, month):
+        return os.path.join(self.directory, f'{month}.jsonl')
+
+    def _archive_path(self, month):
+        return os.path.join(self.archive_directory, f'{month}.jsonl.gz')
+
+    def _list(self, directory, pattern):
+        if not os.path.isdir(directory):
+            return []
+        return sorted(m.group(1) for m in map(pattern.match, os.listdir(directory)) if m)
+
+    def hot(self):
+        return self._list(self.directory, SEGMENT_PATTERN)
+
+    def archived(self):
+        return self._list(self.archive_directory, ARCHIVE_PATTERN)
+
+    def files(self):
+        return [self._segment_path(month) for month in self.hot()]
+
+    def _segment(self, month):
+        segment = self._segments.get(month)
+        if segment is None:
+            segment = self._segments[month] = Segment(self._segment_path(month))
+        segment.refresh()
+        return segment
+
+    def refresh(self):
+        """قراءة الجديد من ملفات الأشهر الحالية، وترك ما أُرشف"""
+        with self._lock:
+            months = self.hot()
+            for month in set(self._segments) - set(months):
+                del self._segments[month]
+            return [self._segment(month) for month in months]
+
+    # ==================== Writes ====================
+
+    def append(self, record):
+        return self.append_many([record])[0]
+
+    def append_many(self, records):
+        """إضافة رسائل (مع رقم وتاريخ وحالة) إلى ملفات أشهرها"""
+        now = datetime.now().strftime(DATE_FORMAT)
+        by_month = {}
+        for record in records:
+            record = dict(record)
+            record.setdefault('التاريخ', now)
+            record.setdefault('الحالة', NEW_STATUS)
+            by_month.setdefault(month_of(record), []).append(record)
+
+        os.makedirs(self.directory, exist_ok=True)
+        added = []
+        with self._lock, file_lock(self._lock_path):
+            for month, group in sorted(by_month.items()):
+                segment = self._segment(month)
+                number = len(segment.messages)
+                for record in group:
+                    number += 1
+                    record['رقم'] = f"{month.replace('-', '')}-{number}"
+                _write_lines(segment.path, _dump(group))
+                segment.refresh()
+                added.extend(group)
+        self.pending += len(added)
+        return [dict(record) for record in added]
+
+    def set_status(self, message_id, status):
+        """تغيير حالة رسالة، ويرجع الرسالة أو None إذا لم تكن في الأشهر الحالية
+
+        ValueError إذا كانت الحالة غير معروفة أو الانتقال غير مسموح.
+        """
+        if status not in MESSAGE_TRANSITIONS:
+            raise ValueError('حالة غير معروفة')
+        month = month_of_id(message_id)
+        with self._lock, file_lock(self._lock_path):
+            if not os.path.exists(self._segment_path(month)):
+                return None
+            segment = self._segment(month)
+            message = segment.messages.get(message_id)
+            if message is None:
+                return None
+            current = message.get('الحالة') or NEW_STATUS
+            if status != current:
+                if status not in MESSAGE_TRANSITIONS.get(current, MESSAGE_STATUSES):
+                    raise ValueError(f'لا يمكن نقل الرسالة من "{current}" إلى "{status}"')
+                change = {UPDATE_MARKER: message_id, 'الحالة': status,
+                          'تاريخ الحالة': datetime.now().strftime(DATE_FORMAT)}
+                _write_lines(segment.path, _dump([change]))
+                segment.refresh()
+            return dict(segment.messages[message_id])
+
+    # ==================== Reads ====================
+
+    def _read_archive(self, month):
+        path = self._archive_path(month)
+        if not os.path.exists(path):
+            return []
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def records(self):
+        """كل رسائل الأشهر الحالية (للبحث)"""
+        with self._lock:
+            return [dict(message) for segment in self.refresh()
+                    for message in segment.messages.values()]
+
+    def query(self, status=None, month=None, offset=0, limit=50):
+        """(العدد، صفحة الرسائل) الأحدث أولاً، من الأشهر الحالية أو من شهر محدد"""
+        if month and month in self.archived():
+            groups = [self._read_archive(month)]
+        else:
+            with self._lock:
+                groups = [[dict(message) for message in segment.messages.values()]
+                          for segment in self.refresh()
+                          if not month or segment.path == self._segment_path(month)]
+        messages = [message for group in reversed(groups) for message in reversed(group)
+                    if not status or message.get('الحالة') == status]
+        return len(messages), messages[offset:offset + limit]
+
+    def counts(self):
+        """عدد رسائل الأشهر الحالية لكل حالة"""
+        counts = dict.fromkeys(MESSAGE_STATUSES, 0)
+        with self._lock:
+            for segment in self.refresh():
+                for message in segment.messages.values():
+                    status = message.get('الحالة') or NEW_STATUS
+                    counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    # ==================== Archival ====================
+
+    def compact(self):
+        """أرشفة الأشهر الأقدم من hot_months وطي الأشهر المنتهية كثيرة التعديل
+
+        يرجع عدد الرسائل المؤرشفة. عامل واحد فقط يعمل في كل مرة، والكتابة
+        والاستبدال تحت قفل الصندوق حتى لا تضيع إضافة أو تعديل متزامن.
+        """
+        current = datetime.now().strftime('%Y-%m')
+        cutoff = _shift_month(current, 1 - self.hot_months)
+        archived = 0
+        with file_lock(self._lock_path + '.compact', blocking=False) as acquired:
+            if not acquired:
+                return 0
+            for month in self.hot():
+                with self._lock, file_lock(self._lock_path):
+                    segment = self._segment(month)
+                    messages = list(segment.messages.values())
+                    if month < cutoff:
+                        os.makedirs(self.archive_directory, exist_ok=True)
+                        # الأرشيف موجود إذا توقف عمل سابق بعد كتابته وقبل حذف الملف
+                        known = {m['رقم'] for m in messages}
+                        earlier = [m for m in self._read_archive(month) if m['رقم'] not in known]
+                        body = _dump(earlier + messages).encode('utf-8')
+
+                        def write_archive(tmp_path):
+                            with gzip.open(tmp_path, 'wb') as f:
+                                f.write(body)
+
+                        atomic_write(self._archive_path(month), write_archive)
+                        os.remove(segment.path)
+                        del self._segments[month]
+                        archived += len(messages)
+                    elif month < current and segment.updates >= self.compact_updates:
+                        def write_folded(tmp_path):
+                            with open(tmp_path, 'w', encoding='utf-8') as f:
+                                f.write(_dump(messages))
+
+                        atomic_write(segment.path, write_folded)
+                        segment.refresh()
+        self.pending = 0
+        return archived
+
+    # ==================== Migration ====================
+
+    def migrate_workbook(self, book):
+        """نقل رسائل contacts.xlsx وسجله إلى الملفات الشهرية، مرة واحدة
+
+        الملف القديم يبقى كما هو، وعلامة migrated في المجلد تمنع التكرار.
+        """
+        marker = os.path.join(self.directory, 'migrated')
+        if os.path.exists(marker) or not any(os.path.exists(p) for p in book.files()):
+            return 0
+        os.makedirs(self.directory, exist_ok=True)
+        with file_lock(marker):
+            if os.path.exists(marker):
+                return 0
+            records = book.records()
+            for record in records:
+                record.pop('رقم', None)
+                record['الحالة'] = record.get('الحالة') or NEW_STATUS
+            records.sort(key=lambda r: str(r.get('التاريخ') or ''))
+            self.append_many(records)
+            with open(marker, 'w', encoding='utf-8') as f:
+                f.write(f'{len(records)} {datetime.now().strftime(DATE_FORMAT)}\n')
+        return len(records)
@@ -0,0 +1,200 @@
+"""قياس زمن الطلبات والعمليات البطيئة وعدادات الذاكرة المؤقتة
+
+metrics.span('workbook_read') يقيس زمن كتلة ويضيفه إلى مدرّج (histogram)
+باسم العملية، وmetrics.count('cache_requests', cache='qr', result='hit') يزيد
+عداداً. init_app يضيف زمن كل مسار وزمن رسم كل قالب.
+
+القيم في ذاكرة العملية (لكل عامل gunicorn عداداته)، وrender() يكتبها بصيغة
+Prometheus النصية.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# حدود خانات الزمن بالثواني
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """عدد القيم في كل خانة مع المجموع والأقصى"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """تقدير من الخانات: حد الخانة التي تبلغ فيها النسبة q (لا يتجاوز الأقصى)"""
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _labels_text(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metrics:
+    """مدرّجات وعدادات بأسماء وتسميات (labels)"""
+
+    HELP = {
+        'http_request_duration_seconds': 'Request latency by endpoint, method and status',
+        'span_duration_seconds': 'Duration of instrumented operations',
+        'template_render_seconds': 'Template render time',
+        'cache_requests_total': 'Cache lookups by cache and result',
+    }
+
+    def __init__(self, prefix='zawiya', buckets=LATENCY_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self.started = time.time()
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def count(self, name, amount=1, **labels):
+        key = (name + '_total', _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    @contextmanager
+    def span(self, name, **labels):
+        """قياس زمن كتلة with كعملية باسم name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('span_duration_seconds', time.perf_counter() - start,
+                         span=name, **labels)
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+            self.started = time.time()
+
+    # ==================== Flask ====================
+
+    def init_app(self, app):
+        """زمن كل طلب حسب endpoint، وزمن رسم القوالب"""
+        from flask import g, request, before_render_template, template_rendered
+
+        @app.before_request
+        def start_request_timer():
+            g.metrics_started = time.perf_counter()
+            g.metrics_templates = []
+
+        @app.after_request
+        def record_request(response):
+            started = g.pop('metrics_started', None)
+            if started is not None:
+                self.observe('http_request_duration_seconds', time.perf_counter() - started,
+                             endpoint=request.endpoint or 'unmatched', method=request.method,
+                             status=response.status_code)
+            return response
+
+        def start_template(sender, template, context, **extra):
+            g.setdefault('metrics_templates', []).append(time.perf_counter())
+
+        def record_template(sender, template, context, **extra):
+            starts = g.get('metrics_templates')
+            if starts:
+                self.observe('template_render_seconds', time.perf_counter() - starts.pop(),
+                             template=template.name or 'string')
+
+        # weak=False لأن الدالتين محليتان ولا مرجع آخر لهما
+        before_render_template.connect(start_template, app, weak=False)
+        template_rendered.connect(record_template, app, weak=False)
+
+    # ==================== Output ====================
+
+    def render(self):
+        """كل القيم بصيغة Prometheus النصية"""
+        with self._lock:
+            histograms = sorted((key, h.counts[:], h.count, h.sum)
+                                for key, h in self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f'# HELP {self.prefix}_{name} {self.HELP.get(name, name)}')
+                lines.append(f'# TYPE {self.prefix}_{name} {kind}')
+
+        for (name, labels), counts, total, seconds in histograms:
+            describe(name, 'histogram')
+            metric = f'{self.prefix}_{name}'
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{_labels_text(labels, le=bound)} {cumulative}')
+            lines.append(f'{metric}_bucket{_labels_text(labels, le="+Inf")} {total}')
+            lines.append(f'{metric}_sum{_labels_text(labels)} {seconds:.6f}')
+            lines.append(f'{metric}_count{_labels_text(labels)} {total}')
+
+        for (name, labels), value in counters:
+            describe(name, 'counter')
+            lines.append(f'{self.prefix}_{name}{_labels_text(labels)} {value}')
+
+        describe('process_start_time_seconds', 'gauge')
+        lines.append(f'{self.prefix}_process_start_time_seconds{_labels_text((), pid=os.getpid())}'
+                     f' {self.started:.0f}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self, name):
+        """صفوف مدرّجات name للعرض، الأكثر استهلاكاً للوقت أولاً (بالمللي ثانية)"""
+        with self._lock:
+            rows = [{
+                'labels': dict(labels),
+                'count': h.count,
+                'total': round(h.sum, 3),
+                'mean': round(h.sum / h.count * 1000, 2),
+                'p50': round(h.quantile(0.5) * 1000, 2),
+                'p95': round(h.quantile(0.95) * 1000, 2),
+                'p99': round(h.quantile(0.99) * 1000, 2),
+                'max': round(h.max * 1000, 2),
+            } for (metric, labels), h in self.histograms.items() if metric == name and h.count]
+        return sorted(rows, key=lambda row: row['total'], reverse=True)
+
+    def counter_rows(self):
+        with self._lock:
+            return [{'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(self.counters.items())]
+
+
+# سجل واحد لكل عملية تستعمله كل الوحدات
+metrics = Metrics()
@@ -0,0 +1,122 @@
+"""ذاكرة مؤقتة للصفحات العامة مع ETag و304 ونسخ مضغوطة مسبقاً
+
+الصفحات العامة (الرئيسية، التسجيل، الاتصال...) لا تتغير إلا مع تغير
+المحتوى، فتُرسم مرة لكل نسخة من البيانات وتُحفظ بايتاتها مع نسختها المضغوطة
+(gzip، وbrotli إن كانت المكتبة مثبتة). الطلبات التالية تأخذ البايتات
+الجاهزة، أو 304 إذا كانت نسخة المتصفح حديثة.
+"""
+import gzip
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from flask import request, make_response
+from werkzeug.http import http_date
+
+from metrics import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# الصفحات الأصغر من هذا لا تستحق الضغط
+COMPRESS_MIN_BYTES = 1024
+
+
+class CachedResponse:
+    """جسم الرد بعد الرسم مع نسخه المضغوطة وبصمته"""
+
+    def __init__(self, version, body, status, mimetype):
+        self.version = version
+        self.status = status
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        self.last_modified = int(time.time())
+        self.bodies = {'identity': body}
+        if len(body) >= COMPRESS_MIN_BYTES:
+            self.bodies['gzip'] = gzip.compress(body, compresslevel=6)
+            if brotli is not None:
+                self.bodies['br'] = brotli.compress(body)
+
+    def encoding_for(self, accept_encodings):
+        for encoding in ('br', 'gzip'):
+            if encoding in self.bodies and accept_encodings[encoding] > 0:
+                return encoding
+        return 'identity'
+
+
+class ResponseCache:
+    """ردود الصفحات العامة حسب المسار ونسخة البيانات"""
+
+    def __init__(self, cache_control='public, no-cache'):
+        self.cache_control = cache_control
+        self._entries = {}
+        # قفل لكل صفحة: رسم صفحة بطيئة لا يوقف رسم الصفحات الأخرى
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def clear(self):
+        self._entries = {}
+
+    def _key_lock(self, key):
+        with self._locks_lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def _render(self, key, version, view, args, kwargs):
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version:
+                response = make_response(view(*args, **kwargs))
+                entry = CachedResponse(version, response.get_data(), response.status_code,
+                                       response.mimetype)
+                if response.status_code in (200, 404):
+                    self._entries[key] = entry
+        return entry
+
+    def respond(self, key, version, view, *args, **kwargs):
+        """رد من الذاكرة لـ key، يُرسم view من جديد إذا تغيرت version"""
+        entry = self._entries.get(key)
+        if entry is None or entry.version != version:
+            metrics.count('cache_requests', cache='page', result='miss')
+            entry = self._render(key, version, view, args, kwargs)
+        else:
+            metrics.count('cache_requests', cache='page', result='hit')
+
+        encoding = entry.encoding_for(request.accept_encodings)
+        etag = entry.etag if encoding == 'identity' else f'{entry.etag}-{encoding}'
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            since = request.if_modified_since
+            not_modified = since is not None and since.timestamp() >= entry.last_modified
+        if not_modified and entry.status == 200:
+            metrics.count('cache_requests', cache='page', result='not_modified')
+            response = make_response('', 304)
+        else:
+            response = make_response(entry.bodies[encoding], entry.status)
+            response.mimetype = entry.mimetype
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Last-Modified'] = http_date(entry.last_modified)
+        response.headers['Cache-Control'] = self.cache_control
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def cached(self, version):
+        """Decorator لصفحة عامة، version() ترجع نسخة البيانات التي تعتمد عليها"""
+        def decorator(view):
+            @wraps(view)
+            def decorated_function(*args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return view(*args, **kwargs)
+                # بدون معاملات الرابط حتى لا تملأ روابط عشوائية الذاكرة
+                key = (request.endpoint, tuple(sorted(kwargs.items())))
+                return self.respond(key, version(), view, *args, **kwargs)
+            return decorated_function
+        return decorator
@@ -0,0 +1,103 @@
+"""عينات دورية من مكدسات الخيوط لمعرفة أين يذهب الوقت في الإنتاج
+
+SamplingProfiler.start(seconds) يشغّل خيطاً يأخذ كل interval مكدس كل خيط
+(sys._current_frames) ويعد تكرار كل مكدس، ثم يتوقف وحده بعد المدة ويكتب
+النتيجة بصيغة folded (سطر لكل مكدس مع عدده) التي تقرؤها أدوات flamegraph
+وspeedscope. لا كلفة حين يكون متوقفاً.
+
+الخيوط المنتظرة (قفل، select، sleep) لا تُحسب حتى لا تغطي على العمل الفعلي.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# دوال آخر إطار فيها يعني أن الخيط ينتظر
+IDLE_FUNCTIONS = {'wait', 'select', 'poll', 'accept', 'sleep', '_wait_for_tstate_lock'}
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """مكدسات الخيوط كل interval ثانية لمدة محددة"""
+
+    def __init__(self, directory, interval=0.005, max_seconds=300):
+        self.directory = directory
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.samples = Counter()
+        self.started = None
+        self._thread = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds=30):
+        """بدء أخذ العينات، False إذا كان يعمل أصلاً"""
+        with self._lock:
+            if self.running:
+                return False
+            seconds = min(max(seconds, 1), self.max_seconds)
+            self.samples = Counter()
+            self.started = time.time()
+            self._done.clear()
+            self._thread = threading.Thread(target=self._run, args=(seconds,), daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._done.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, seconds):
+        me = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while not self._done.is_set() and time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me or frame.f_code.co_name in IDLE_FUNCTIONS:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                self.samples[';'.join(reversed(stack))] += 1
+            self._done.wait(self.interval)
+        self.save()
+
+    def folded(self):
+        return ''.join(f'{stack} {n}\n' for stack, n in self.samples.copy().most_common())
+
+    def top(self, limit=20):
+        """الدوال الأكثر ظهوراً في آخر المكدس: [(الدالة، العينات، النسبة)]"""
+        own = Counter()
+        for stack, n in self.samples.copy().items():
+            own[stack.rsplit(';', 1)[-1]] += n
+        total = sum(own.values()) or 1
+        return [(name, n, round(n * 100 / total, 1)) for name, n in own.most_common(limit)]
+
+    def save(self):
+        """كتابة العينات في ملف باسم الوقت ورقم العملية، وإرجاع اسمه"""
+        if not self.samples:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.fromtimestamp(self.started).strftime('%Y%m%d-%H%M%S')
+        name = f'profile-{stamp}-{os.getpid()}.folded'
+        with open(os.path.join(self.directory, name), 'w', encoding='utf-8') as f:
+            f.write(self.folded())
+        return name
+
+    def profiles(self, limit=20):
+        """آخر الملفات المحفوظة (من كل العمال)"""
+        if not os.path.isdir(self.directory):
+            return []
+        names = [name for name in os.listdir(self.directory) if name.endswith('.folded')]
+        return sorted(names, reverse=True)[:limit]
@@ -0,0 +1,223 @@
+"""رموز QR للحصص
+
+الرمز يعتمد فقط على محتواه (رابط دخول الحصة) وخيارات الرسم، لذلك يُسمّى الملف
+ببصمة هذا المحتوى ويُنشأ مرة واحدة ويشترك فيه كل الطلاب، بدل ملف لكل
+طالب ولكل حصة.
+
+QRCache يرسم الرموز عند الطلب ويحتفظ بالبايتات في ذاكرة LRU محدودة، والبصمة
+نفسها تُستعمل كـ ETag.
+"""
+import filecmp
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from metrics import metrics
+from storage import atomic_write
+
+# خيارات الرسم الافتراضية المستعملة في كل الموقع
+QR_OPTIONS = {
+    'box_size': 10,
+    'border': 4,
+    'fill_color': 'black',
+    'back_color': 'white',
+}
+
+QR_MIMETYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+def qr_digest(payload, fmt='png', **options):
+    """بصمة المحتوى والصيغة وخيارات الرسم"""
+    options = dict(QR_OPTIONS, **options)
+    key = json.dumps([payload, fmt, options], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:20]
+
+
+def qr_filename(payload, **options):
+    return f"qr_{qr_digest(payload, 'png', **options)}.png"
+
+
+def make_qr_image(payload, **options):
+    import qrcode
+    options = dict(QR_OPTIONS, **options)
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=options['box_size'],
+        border=options['border']
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr.make_image(fill_color=options['fill_color'], back_color=options['back_color'])
+
+
+def ensure_qr_file(directory, payload, **options):
+    """إرجاع اسم ملف الرمز في directory بعد إنشائه إن لم يكن موجوداً"""
+    filename = qr_filename(payload, **options)
+    path = os.path.join(directory, filename)
+    if not os.path.exists(path):
+        with metrics.span('qr_render', fmt='png'):
+            img = make_qr_image(payload, **options)
+            atomic_write(path, lambda tmp: img.save(tmp))
+    return filename
+
+
+def render_qr(payload, fmt='png', **options):
+    """رسم الرمز وإرجاعه كبايتات بالصيغة المطلوبة"""
+    with metrics.span('qr_render', fmt=fmt):
+        if fmt == 'svg':
+            import qrcode
+            import qrcode.image.svg
+            options = dict(QR_OPTIONS, **options)
+            qr = qrcode.QRCode(
+                version=1,
+                error_correction=qrcode.constants.ERROR_CORRECT_L,
+                box_size=options['box_size'],
+                border=options['border'],
+                image_factory=qrcode.image.svg.SvgPathImage
+            )
+            qr.add_data(payload)
+            qr.make(fit=True)
+            img = qr.make_image()
+        else:
+            img = make_qr_image(payload, **options)
+        output = BytesIO()
+        img.save(output)
+        return output.getvalue()
+
+
+class LRUCache:
+    """ذاكرة مؤقتة محدودة بعدد العناصر وبمجموع أحجامها"""
+
+    def __init__(self, max_entries=256, max_bytes=8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._items:
+                self._bytes -= len(self._items.pop(key))
+            self._items[key] = value
+            self._bytes += len(value)
+            while self._items and (len(self._items) > self.max_entries
+                                   or self._bytes > self.max_bytes):
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class QRCache:
+    """رسم الرموز عند الطلب مع ذاكرة LRU
+
+    الترتيب: الذاكرة، ثم ملف مشترك في directory إن وُجد (PNG بالخيارات
+    الافتراضية)، ثم الرسم. لا كتابة على القرص هنا.
+    """
+
+    def __init__(self, directory, max_entries=256, max_bytes=8 * 1024 * 1024):
+        self.directory = directory
+        self.cache = LRUCache(max_entries, max_bytes)
+
+    def get(self, payload, fmt='png', **options):
+        """إرجاع (البصمة، البايتات)"""
+        digest = qr_digest(payload, fmt, **options)
+        body = self.cache.get(digest)
+        if body is not None:
+            metrics.count('cache_requests', cache='qr', result='hit')
+            return digest, body
+        path = os.path.join(self.directory, f"qr_{digest}.png")
+        if fmt == 'png' and os.path.exists(path):
+            metrics.count('cache_requests', cache='qr', result='file')
+            with open(path, 'rb') as f:
+                body = f.read()
+        else:
+            metrics.count('cache_requests', cache='qr', result='miss')
+            body = render_qr(payload, fmt, **options)
+        self.cache.put(digest, body)
+        return digest, body
+
+
+# ==================== Legacy QR Regeneration ====================
+
+def legacy_qr_files(directory, schedule_id):
+    """ملفات الطلاب القديمة qr_{id}_{student}.png وملف qr_schedule_{id}_updated.png"""
+    prefix = f"qr_{schedule_id}_"
+    names = [name for name in os.listdir(directory)
+             if name.startswith(prefix) and name.endswith('.png')]
+    updated = f"qr_schedule_{schedule_id}_updated.png"
+    if os.path.exists(os.path.join(directory, updated)):
+        names.append(updated)
+    return sorted(names)
+
+
+def same_content(path, shared_path):
+    """الملف رابط صلب إلى الملف المشترك أو نسخة مطابقة منه"""
+    try:
+        if os.path.samefile(path, shared_path):
+            return True
+        if os.path.getsize(path) != os.path.getsize(shared_path):
+            return False
+    except OSError:
+        return False
+    return filecmp.cmp(path, shared_path, shallow=False)
+
+
+def repoint_file(directory, name, shared_name):
+    """استبدال ملف قديم برابط صلب إلى الملف المشترك (أو نسخة منه) دفعة واحدة
+
+    يرجع False إذا كان الملف يشير إلى نفس الرمز من قبل.
+    """
+    path = os.path.join(directory, name)
+    shared_path = os.path.join(directory, shared_name)
+    if same_content(path, shared_path):
+        return False
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(shared_path, tmp_path)
+    except OSError:
+        with open(shared_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            dst.write(src.read())
+    os.replace(tmp_path, path)
+    return True
+
+
+def repoint_legacy_qrcodes(directory, schedule_id, payload, progress=None, cancelled=None):
+    """إعادة توجيه ملفات الطلاب القديمة لحصة إلى رمز الرابط الجديد
+
+    الرمز الجديد يُرسم مرة واحدة كملف مشترك ثم يحل محل كل ملف قديم، وما يشير
+    إليه من قبل يُترك.
+    progress(done, total) لمتابعة التقدم، وcancelled() توقف العمل إذا صار
+    هناك تحديث أحدث لنفس الحصة.
+    """
+    shared_name = ensure_qr_file(directory, payload)
+    names = legacy_qr_files(directory, schedule_id)
+    if progress:
+        progress(0, len(names))
+    for done, name in enumerate(names, 1):
+        if cancelled and cancelled():
+            return
+        try:
+            repoint_file(directory, name, shared_name)
+        except OSError as e:
+            print(f"Error repointing {name}: {str(e)}")
+        if progress and (done % 50 == 0 or done == len(names)):
+            progress(done)
@@ -0,0 +1,64 @@
+"""جداول الحصص لكل برنامج، محسوبة ومرسومة مرة واحدة
+
+صفحة جدول الطالب لا يختلف فيها من طالب لآخر إلا بياناته الشخصية، أما قائمة
+الحصص فتعتمد على البرنامج فقط. لذلك تُحسب قائمة حصص كل برنامج ويُرسم جزء
+الصفحة الخاص بها مرة واحدة، ثم يُعاد استعماله حتى يتغير الجدول.
+"""
+import threading
+
+from markupsafe import Markup
+
+# برامج تظهر حصصها لكل الطلاب مهما كان برنامجهم
+SHARED_PROGRAMS = ('review', 'tijani')
+
+
+def program_schedules(schedules, program):
+    """حصص البرنامج مع الحصص المشتركة، بترتيب الجدول"""
+    return [s for s in schedules
+            if s['program'] == program or s['program'] in SHARED_PROGRAMS]
+
+
+class ScheduleViews:
+    """حصص كل برنامج وجزء الصفحة المرسوم لها
+
+    render(schedules) ترجع HTML قائمة الحصص، وتُستدعى مرة واحدة لكل برنامج
+    بعد كل rebuild(). الحالة تُستبدل كاملة عند إعادة البناء فلا يرى طلب
+    جارٍ نصف جدول قديم ونصف جديد.
+    """
+
+    def __init__(self, schedules, render):
+        self.render = render
+        self._lock = threading.Lock()
+        self.rebuild(schedules)
+
+    def rebuild(self, schedules):
+        """إعادة الحساب بعد أي تغيير في الجدول (رابط حصة مثلاً)"""
+        links = {s['id']: s['meet_link'] for s in schedules}
+        self._state = (list(schedules), {}, {}, links)
+
+    @staticmethod
+    def _view(state, program):
+        source, views = state[:2]
+        view = views.get(program)
+        if view is None:
+            view = views[program] = program_schedules(source, program)
+        return view
+
+    def schedules(self, program):
+        return self._view(self._state, program)
+
+    def meet_link(self, schedule_id):
+        """رابط الحصة الحالي أو None"""
+        return self._state[3].get(schedule_id)
+
+    def fragment(self, program):
+        """HTML حصص البرنامج، يُرسم عند أول طلب بعد كل إعادة بناء"""
+        state = self._state
+        fragment = state[2].get(program)
+        if fragment is None:
+            with self._lock:
+                fragment = state[2].get(program)
+                if fragment is None:
+                    fragment = Markup(self.render(self._view(state, program)))
+                    state[2][program] = fragment
+        return fragment
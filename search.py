@@ -0,0 +1,214 @@
+"""فهرس بحث نصي للطلاب ورسائل الاتصال
+
+النصوص تُوحّد قبل الفهرسة (الألف والهمزات، التاء المربوطة، الألف المقصورة،
+التشكيل والتطويل، الأرقام الهندية)، ثم يُبحث في الكلمات بالمطابقة التامة أو
+ببداية الكلمة أو بخطأ إملائي واحد. الفهرس يُحدّث مع كل إضافة أو حذف.
+"""
+import re
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+
+_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_FOLD = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه', 'ى': 'ي', 'ؤ': 'و', 'ئ': 'ي',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+})
+_TOKEN = re.compile(r'\w+')
+
+
+def normalize_text(text):
+    """توحيد النص العربي واللاتيني للبحث"""
+    if text is None:
+        return ''
+    text = _DIACRITICS.sub('', str(text).lower())
+    return text.translate(_FOLD)
+
+
+def tokenize(text):
+    tokens = []
+    for token in _TOKEN.findall(normalize_text(text)):
+        if token.isdigit():
+            # أرقام الهاتف تُحفظ أحياناً بلا الصفر الأول
+            token = token.lstrip('0') or '0'
+        tokens.append(token)
+    return tokens
+
+
+def _deletes(token):
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _within_one_edit(a, b):
+    """هل بين الكلمتين تعديل واحد على الأكثر (حذف، إضافة، تبديل أو قلب حرفين)"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diff) == 1 or (len(diff) == 2 and diff[1] == diff[0] + 1
+                                  and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]])
+    if len(a) > len(b):
+        a, b = b, a
+    return any(b[:i] + b[i + 1:] == a for i in range(len(b)))
+
+
+class SearchIndex:
+    """فهرس مقلوب: كلمة -> المستندات، مع قائمة مرتبة للبحث ببداية الكلمة
+
+    الأخطاء الإملائية تُجاب بفهرس الحذف (كل كلمة مع نسخها الناقصة حرفاً)،
+    فلا نقارن الاستعلام بكل كلمات الفهرس.
+    """
+
+    # أقصر كلمة نقبل فيها خطأ إملائياً
+    FUZZY_MIN_LENGTH = 4
+
+    def __init__(self, fields):
+        self.fields = fields
+        self._postings = {}
+        self._documents = {}
+        self._deletes = {}
+        self._sorted_tokens = None
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, doc_id, record):
+        self.remove(doc_id)
+        tokens = set()
+        for field in self.fields:
+            tokens.update(tokenize(record.get(field)))
+        self._documents[doc_id] = tokens
+        for token in tokens:
+            docs = self._postings.get(token)
+            if docs is None:
+                docs = self._postings[token] = set()
+                self._sorted_tokens = None
+                if len(token) >= self.FUZZY_MIN_LENGTH:
+                    for variant in _deletes(token):
+                        self._deletes.setdefault(variant, set()).add(token)
+            docs.add(doc_id)
+
+    def remove(self, doc_id):
+        tokens = self._documents.pop(doc_id, None)
+        if not tokens:
+            return
+        for token in tokens:
+            docs = self._postings[token]
+            docs.discard(doc_id)
+            if not docs:
+                del self._postings[token]
+                self._sorted_tokens = None
+                if len(token) >= self.FUZZY_MIN_LENGTH:
+                    for variant in _deletes(token):
+                        bucket = self._deletes.get(variant)
+                        if bucket:
+                            bucket.discard(token)
+                            if not bucket:
+                                del self._deletes[variant]
+
+    def _prefix_tokens(self, prefix):
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self._postings)
+        tokens = self._sorted_tokens
+        i = bisect_left(tokens, prefix)
+        while i < len(tokens) and tokens[i].startswith(prefix):
+            yield tokens[i]
+            i += 1
+
+    def _fuzzy_tokens(self, token):
+        candidates = set(self._deletes.get(token, ()))
+        for variant in _deletes(token) | {token}:
+            if variant in self._postings:
+                candidates.add(variant)
+            candidates.update(self._deletes.get(variant, ()))
+        return [c for c in candidates if _within_one_edit(token, c)]
+
+    def _match(self, token, fuzzy):
+        """{المستند: الدرجة} لكلمة واحدة من الاستعلام"""
+        scores = {}
+        for doc_id in self._postings.get(token, ()):
+            scores[doc_id] = 3
+        for match in self._prefix_tokens(token):
+            for doc_id in self._postings[match]:
+                scores.setdefault(doc_id, 2)
+        if fuzzy and not scores and len(token) >= self.FUZZY_MIN_LENGTH:
+            for match in self._fuzzy_tokens(token):
+                for doc_id in self._postings[match]:
+                    scores.setdefault(doc_id, 1)
+        return scores
+
+    def search(self, query, limit=None, fuzzy=True):
+        """معرفات المستندات التي تطابق كل كلمات الاستعلام، الأقرب أولاً"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        total = None
+        for token in tokens:
+            scores = self._match(token, fuzzy)
+            if total is None:
+                total = scores
+            else:
+                total = {doc_id: total[doc_id] + score
+                         for doc_id, score in scores.items() if doc_id in total}
+            if not total:
+                return []
+        ranked = sorted(total, key=lambda doc_id: -total[doc_id])
+        return ranked[:limit] if limit else ranked
+
+
+class RecordSearch:
+    """سجلات مع فهرس بحث، تُحمّل من جديد إذا تغير توقيع ملفاتها
+
+    load() ترجع كل السجلات وsignature() توقيع الملفات التي تحملها. الكتابة
+    عبر write() تُفهرس السجل الجديد مباشرة إذا لم يكتب أحد غيرنا منذ آخر
+    تحميل، كما في StudentCache. write_lock() قفل بين العمال يمسكه كل من يكتب
+    عبر write()، حتى لا تدخل كتابة عامل آخر بين التوقيعين.
+    """
+
+    def __init__(self, load, signature, key, fields, write_lock=nullcontext):
+        self.load = load
+        self.signature = signature
+        self.key = key
+        self.fields = fields
+        self.write_lock = write_lock
+        self._lock = threading.RLock()
+        self._signature = None
+        self._records = {}
+        self.index = SearchIndex(fields)
+
+    def refresh(self):
+        signature = self.signature()
+        if signature != self._signature:
+            with self._lock:
+                index = SearchIndex(self.fields)
+                records = {}
+                for record in self.load():
+                    records[record[self.key]] = record
+                    index.add(record[self.key], record)
+                self._records, self.index, self._signature = records, index, signature
+
+    def write(self, write):
+        """تنفيذ write() التي ترجع السجل المكتوب (أو None) ثم فهرسته"""
+        with self._lock:
+            self.refresh()
+            with self.write_lock():
+                before = self.signature()
+                record = write()
+                after = self.signature()
+            if before == self._signature:
+                if record is not None:
+                    self._records[record[self.key]] = record
+                    self.index.add(record[self.key], record)
+                self._signature = after
+            else:
+                self._signature = None
+        return record
+
+    def search(self, query, limit=20):
+        self.refresh()
+        with self._lock:
+            return [self._records[doc_id] for doc_id in self.index.search(query, limit)]
@@ -532,6 +532,40 @@ ZawiyaApp.prototype.hideLoading = function() {
     }
 };
 
+// ========== Registration Request ==========
+// Idempotency-Key ثابت لنفس البيانات: إعادة الإرسال لا تنشئ تسجيلاً ثانياً
+ZawiyaApp.prototype.newRequestKey = function() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 12);
+};
+
+// يرجع null إذا كان هناك تسجيل جارٍ (نقرة مزدوجة أو معالج ثانٍ لنفس النموذج)
+ZawiyaApp.prototype.submitRegistration = async function(formData) {
+    if (this.registrationPending) {
+        return null;
+    }
+    const body = JSON.stringify(formData);
+    if (!this.registrationKey || this.registrationKey.body !== body) {
+        this.registrationKey = { body: body, key: this.newRequestKey() };
+    }
+    this.registrationPending = true;
+    try {
+        const response = await fetch('/api/register', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Idempotency-Key': this.registrationKey.key
+            },
+            body: body
+        });
+        return await response.json();
+    } finally {
+        this.registrationPending = false;
+    }
+};
+
 // ========== Initialize App ==========
 const app = new ZawiyaApp();
 
@@ -722,15 +756,8 @@ class RegistrationForm {
 
             try {
                 // Send data to server
-                const response = await fetch('/api/register', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify(this.formData)
-                });
-
-                const result = await response.json();
+                const result = await window.ZawiyaApp.submitRegistration(this.formData);
+                if (!result) return;
 
                 // Hide loading modal
                 if (loadingModal) {
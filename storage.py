@@ -0,0 +1,1028 @@
+"""طبقة تخزين بيانات الطلاب
+
+كل المسارات في app.py تمر عبر واجهة StudentStore بدلاً من قراءة ملف Excel
+وإعادة كتابته في كل طلب. المحرك الافتراضي هو SQLite مع فهارس على الأعمدة
+التي نبحث بها، أما ملف Excel فيبقى صيغة للاستيراد والتصدير فقط.
+
+إذا بقي ملف Excel هو المرجع (STORAGE_BACKEND=excel) فالكتابة تُضاف إلى
+سجل JSON-lines بجانبه، ويُدمج السجل في الملف دفعة واحدة في الخلفية.
+
+كل كتابة على ملفات البيانات تتم تحت قفل استشاري بين العمليات (عدة عمال
+gunicorn) وعبر ملف مؤقت يُستبدل به الأصل دفعة واحدة.
+"""
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from aggregates import StudentAggregates
+from metrics import metrics
+from search import SearchIndex, tokenize
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# (اسم العمود في قاعدة البيانات، اسم العمود في ملف Excel)
+STUDENT_FIELDS = [
+    ('reg_no', 'رقم التسجيل'),
+    ('student_id', 'معرف فريد'),
+    ('first_name', 'الاسم'),
+    ('last_name', 'اللقب'),
+    ('age', 'العمر'),
+    ('gender', 'الجنس'),
+    ('address', 'مكان الإقامة'),
+    ('state', 'الولاية'),
+    ('phone', 'رقم الهاتف'),
+    ('email', 'البريد الإلكتروني'),
+    ('program', 'البرنامج المختار'),
+    ('registered_at', 'تاريخ التسجيل'),
+    ('status', 'الحالة'),
+]
+
+STUDENT_COLUMNS = [label for _, label in STUDENT_FIELDS]
+
+CONTACT_COLUMNS = [
+    'رقم', 'الاسم', 'البريد الإلكتروني', 'رقم الهاتف',
+    'الموضوع', 'الرسالة', 'التاريخ', 'الحالة'
+]
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+ACTIVE_STATUS = 'نشط'
+
+
+# ==================== File Locking ====================
+
+@contextmanager
+def file_lock(path, blocking=True):
+    """قفل استشاري بين العمليات على ملف path.lock
+
+    يُرجع True إذا حصلنا على القفل؛ مع blocking=False يُرجع False فوراً
+    إذا كانت عملية أخرى تمسكه.
+    """
+    lock_file = open(path + '.lock', 'a+')
+    acquired = False
+    try:
+        if fcntl is not None:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(lock_file.fileno(), flags)
+                acquired = True
+            except BlockingIOError:
+                pass
+        else:
+            while not acquired:
+                try:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+                    acquired = True
+                except OSError:
+                    if not blocking:
+                        break
+                    time.sleep(0.05)
+        yield acquired
+    finally:
+        if acquired:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        lock_file.close()
+
+
+@contextmanager
+def temporary_sibling(path):
+    """ملف مؤقت في نفس مجلد path (ونفس الامتداد)، يُحذف إن لم يُستبدل به الأصل"""
+    directory, name = os.path.split(path)
+    suffix = os.path.splitext(name)[1]
+    fd, tmp_path = tempfile.mkstemp(dir=directory or '.', prefix='.' + name, suffix=suffix)
+    os.close(fd)
+    try:
+        yield tmp_path
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def fsync_file(path):
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+
+def atomic_write(path, write):
+    """كتابة ملف عبر ملف مؤقت في نفس المجلد ثم استبداله بالأصل
+
+    write تستقبل مسار الملف المؤقت. القارئ يرى إما النسخة القديمة كاملة
+    أو الجديدة كاملة، ولا يرى ملفاً نصف مكتوب.
+    """
+    with temporary_sibling(path) as tmp_path:
+        write(tmp_path)
+        fsync_file(tmp_path)
+        os.replace(tmp_path, path)
+
+
+class StudentStore:
+    """الواجهة المشتركة لمحركات تخزين الطلاب
+
+    السجلات تُمرر وتُعاد كقواميس بأسماء أعمدة ملف Excel حتى تبقى
+    القوالب والـ APIs كما هي مهما كان المحرك المستعمل.
+    """
+
+    def add(self, record):
+        """إضافة طالب وإرجاع السجل بعد إسناد رقم التسجيل"""
+        raise NotImplementedError
+
+    def add_many(self, records):
+        """إضافة عدة طلاب دفعة واحدة"""
+        return [self.add(record) for record in records]
+
+    def get(self, student_id):
+        """البحث عن طالب بمعرفه الفريد، أو None"""
+        raise NotImplementedError
+
+    def all(self):
+        """جميع الطلاب بترتيب التسجيل"""
+        raise NotImplementedError
+
+    def set_status(self, student_id, status):
+        """تغيير حالة طالب، ويرجع False إذا لم يوجد"""
+        raise NotImplementedError
+
+    def files(self):
+        """الملفات التي تحمل البيانات، تغيّرها يعني أن البيانات تغيّرت"""
+        return []
+
+    def last_change(self):
+        """رقم آخر تغيير، أو None إذا لم يكن للمحرك تسلسل تغييرات"""
+        return None
+
+    def changes_since(self, seq):
+        """(السجلات المضافة أو المعدلة بعد التغيير seq، رقم آخر تغيير)"""
+        raise NotImplementedError
+
+    def reopen(self):
+        """ترك اتصالات العملية الأم بعد fork (gunicorn --preload)"""
+
+    def iter_filtered(self, program=None, status=None, date_from=None, date_to=None):
+        """مولّد للطلاب حسب البرنامج والحالة وفترة التسجيل (YYYY-MM-DD، شاملة)"""
+        for s in self.all():
+            registered = str(s['تاريخ التسجيل'] or '')
+            if program and s['البرنامج المختار'] != program:
+                continue
+            if status and s['الحالة'] != status:
+                continue
+            if date_from and registered < date_from:
+                continue
+            if date_to and registered[:10] > date_to:
+                continue
+            yield s
+
+    def count(self):
+        return len(self.all())
+
+    def emails(self, program=None, status=None):
+        """إيميلات الطلاب الموحدة بلا تكرار، مع التصفية حسب البرنامج والحالة"""
+        return _unique_emails(s['البريد الإلكتروني'] for s in self.all()
+                              if (program is None or s['البرنامج المختار'] == program)
+                              and (status is None or s['الحالة'] == status))
+
+    def summary(self, recent_days=7):
+        """ملخص الإحصائيات: المجموع، النشطون، توزيع البرامج والتسجيلات الحديثة"""
+        students = self.all()
+        since = (datetime.now() - timedelta(days=recent_days)).strftime(DATE_FORMAT)
+        programs = {}
+        for s in students:
+            programs[s['البرنامج المختار']] = programs.get(s['البرنامج المختار'], 0) + 1
+        return {
+            'total': len(students),
+            'active': sum(1 for s in students if s['الحالة'] == ACTIVE_STATUS),
+            'programs': programs,
+            'recent': sum(1 for s in students if str(s['تاريخ التسجيل']) >= since),
+        }
+
+
+class SQLiteStudentStore(StudentStore):
+    """محرك SQLite المضمّن: التسجيل إدراج سطر واحد والبحث قراءة مفهرسة
+
+    كل إضافة أو تغيير حالة يأخذ رقماً متزايداً في change_seq، فتلحق نسخ
+    العمال الأخرى بما تغيّر فقط بدل إعادة قراءة الجدول كله.
+    """
+
+    # رقم التغيير التالي، يُحسب داخل معاملة الكتابة نفسها
+    NEXT_SEQ = '(SELECT COALESCE(MAX(change_seq), 0) + 1 FROM students)'
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._init_schema()
+
+    def files(self):
+        return [self.path, self.path + '-wal']
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def reopen(self):
+        self._local = threading.local()
+
+    def _init_schema(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS students (
+                    reg_no INTEGER PRIMARY KEY AUTOINCREMENT,
+                    student_id TEXT NOT NULL UNIQUE,
+                    first_name TEXT, last_name TEXT, age, gender TEXT,
+                    address TEXT, state TEXT, phone, email TEXT,
+                    program TEXT, registered_at TEXT, status TEXT,
+                    change_seq INTEGER
+                )''')
+            columns = [row['name'] for row in conn.execute('PRAGMA table_info(students)')]
+            if 'change_seq' not in columns:
+                # قاعدة من قبل تسلسل التغييرات: رقم التسجيل يكفي للصفوف الموجودة
+                conn.execute('ALTER TABLE students ADD COLUMN change_seq INTEGER')
+                conn.execute('UPDATE students SET change_seq = reg_no')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_students_change_seq ON students(change_seq)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_students_program ON students(program)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_students_status ON students(status)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_students_registered ON students(registered_at)')
+
+    @staticmethod
+    def _to_record(row):
+        return {label: row[name] for name, label in STUDENT_FIELDS}
+
+    @staticmethod
+    def _to_row(record):
+        return {name: record.get(label) for name, label in STUDENT_FIELDS}
+
+    def add(self, record):
+        return self.add_many([record])[0]
+
+    def add_many(self, records):
+        conn = self._connect()
+        added = []
+        with conn:
+            for record in records:
+                row = self._to_row(record)
+                names = [n for n, _ in STUDENT_FIELDS if n != 'reg_no' or row['reg_no'] is not None]
+                cur = conn.execute(
+                    f"INSERT INTO students ({', '.join(names)}, change_seq) "
+                    f"VALUES ({', '.join('?' * len(names))}, {self.NEXT_SEQ})",
+                    [row[n] for n in names])
+                added.append(dict(record, **{'رقم التسجيل': cur.lastrowid}))
+        return added
+
+    def set_status(self, student_id, status):
+        conn = self._connect()
+        with conn:
+            cur = conn.execute(f'UPDATE students SET status = ?, change_seq = {self.NEXT_SEQ} '
+                               'WHERE student_id = ?', (status, student_id))
+        return cur.rowcount > 0
+
+    def get(self, student_id):
+        row = self._connect().execute(
+            'SELECT * FROM students WHERE student_id = ?', (student_id,)).fetchone()
+        return self._to_record(row) if row else None
+
+    def all(self):
+        rows = self._connect().execute('SELECT * FROM students ORDER BY reg_no')
+        return [self._to_record(row) for row in rows]
+
+    def count(self):
+        return self._connect().execute('SELECT COUNT(*) FROM students').fetchone()[0]
+
+    def last_change(self):
+        return self._connect().execute(
+            'SELECT COALESCE(MAX(change_seq), 0) FROM students').fetchone()[0]
+
+    def changes_since(self, seq):
+        rows = self._connect().execute(
+            'SELECT * FROM students WHERE change_seq > ? ORDER BY change_seq', (seq,)).fetchall()
+        return [self._to_record(row) for row in rows], rows[-1]['change_seq'] if rows else seq
+
+    def iter_filtered(self, program=None, status=None, date_from=None, date_to=None):
+        # مؤشر مباشر على القاعدة: الصفوف تُقرأ واحداً واحداً ولا تُحمّل كلها في الذاكرة
+        clauses, params = [], []
+        if program:
+            clauses.append('program = ?')
+            params.append(program)
+        if status:
+            clauses.append('status = ?')
+            params.append(status)
+        if date_from:
+            clauses.append('registered_at >= ?')
+            params.append(date_from)
+        if date_to:
+            clauses.append('registered_at <= ?')
+            params.append(date_to + ' 23:59:59')
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            for row in conn.execute(f'SELECT * FROM students {where} ORDER BY reg_no', params):
+                yield self._to_record(row)
+        finally:
+            conn.close()
+
+    def emails(self, program=None, status=None):
+        clauses, params = [], []
+        if program is not None:
+            clauses.append('program = ?')
+            params.append(program)
+        if status is not None:
+            clauses.append('status = ?')
+            params.append(status)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._connect().execute(f'SELECT email FROM students {where} ORDER BY reg_no', params)
+        return _unique_emails(row[0] for row in rows)
+
+    def summary(self, recent_days=7):
+        conn = self._connect()
+        since = (datetime.now() - timedelta(days=recent_days)).strftime(DATE_FORMAT)
+        total, active, recent = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(status = ?), 0), COALESCE(SUM(registered_at >= ?), 0) '
+            'FROM students', (ACTIVE_STATUS, since)).fetchone()
+        programs = dict(conn.execute(
+            'SELECT program, COUNT(*) FROM students GROUP BY program ORDER BY COUNT(*) DESC'))
+        return {'total': total, 'active': active, 'programs': programs, 'recent': recent}
+
+
+# ==================== Journaled Workbooks ====================
+
+# مفتاح يميز أسطر التعديل عن أسطر الإضافة في السجل
+UPDATE_MARKER = '__update__'
+
+class JournaledWorkbook:
+    """ملف Excel مع سجل إضافات JSON-lines بجانبه
+
+    الإضافة سطر واحد في السجل (O(1)) بدل إعادة كتابة الملف كله، والقراءة
+    تدمج محتوى الملف مع ما في السجل. compact() يطوي السجل في الملف دفعة
+    واحدة ثم يفرغه.
+    """
+
+    def __init__(self, path, columns, key, number_column=None):
+        self.path = path
+        self.columns = columns
+        self.key = key
+        self.number_column = number_column
+        self.journal_path = path + '.journal.jsonl'
+        # السجل الذي تجري طيّه حالياً، يبقى مقروءاً حتى تنتهي الكتابة
+        self.compacting_path = path + '.compacting.jsonl'
+        self.pending = 0
+        self._rows_cache = (None, 0)
+
+    def ensure_exists(self):
+        with file_lock(self.path):
+            if not os.path.exists(self.path):
+                atomic_write(self.path, lambda tmp: self._write_workbook([], tmp))
+
+    def append(self, record):
+        """إضافة سجل إلى السجل مع فرضه على القرص قبل الرد"""
+        return self.append_many([record])[0]
+
+    def append_many(self, records):
+        """إضافة عدة سجلات بقفل واحد وكتابة واحدة وfsync واحد
+
+        الترقيم والإضافة تحت قفل الملف حتى لا يأخذ عاملان نفس الرقم.
+        """
+        records = [dict(record) for record in records]
+        with file_lock(self.path):
+            if self.number_column:
+                number = self.count()
+                for record in records:
+                    if record.get(self.number_column) is None:
+                        number += 1
+                        record[self.number_column] = number
+            lines = ''.join(json.dumps(record, ensure_ascii=False, default=str) + '\n'
+                            for record in records)
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+        self.pending += len(records)
+        return records
+
+    def _read_workbook(self):
+        if not os.path.exists(self.path):
+            return []
+        import pandas as pd
+        with metrics.span('workbook_read', file=os.path.basename(self.path)):
+            df = pd.read_excel(self.path, engine='openpyxl')
+        df = df.astype(object).where(df.notna(), None)
+        return df.to_dict('records')
+
+    def _write_workbook(self, records, target):
+        import pandas as pd
+        with metrics.span('workbook_write', file=os.path.basename(self.path)):
+            df = pd.DataFrame(records, columns=self.columns)
+            df.to_excel(target, index=False, engine='openpyxl')
+
+    def _read_journal(self, path):
+        if not os.path.exists(path):
+            return []
+        records = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # سطر مبتور من توقف مفاجئ أثناء الكتابة
+                    continue
+        return records
+
+    def update(self, key, changes):
+        """تعديل حقول سجل موجود، يُكتب كسطر تعديل في السجل ويُطبق عند الطي"""
+        line = json.dumps(dict(changes, **{UPDATE_MARKER: key}), ensure_ascii=False, default=str)
+        with file_lock(self.path):
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+        self.pending += 1
+
+    def journal_records(self):
+        """ما لم يُطوَ بعد في ملف Excel"""
+        return self._read_journal(self.compacting_path) + self._read_journal(self.journal_path)
+
+    def _merge(self, records, tail):
+        """دمج أسطر السجل (إضافات وتعديلات) في السجلات، ويرجع عدد الإضافات"""
+        by_key = {r.get(self.key): r for r in records}
+        added = 0
+        for entry in tail:
+            if UPDATE_MARKER in entry:
+                changes = dict(entry)
+                target = by_key.get(changes.pop(UPDATE_MARKER))
+                if target is not None:
+                    target.update(changes)
+            elif entry.get(self.key) not in by_key:
+                records.append(entry)
+                by_key[entry.get(self.key)] = entry
+                added += 1
+        return added
+
+    def records(self):
+        """محتوى الملف مضافاً إليه ذيل السجل"""
+        records = self._read_workbook()
+        self._merge(records, self.journal_records())
+        for record in records:
+            for column in self.columns:
+                record.setdefault(column, None)
+        return records
+
+    def _workbook_rows(self):
+        """عدد أسطر الملف من أبعاد الورقة دون تحليل محتواها"""
+        if not os.path.exists(self.path):
+            return 0
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if self._rows_cache[0] != signature:
+            from openpyxl import load_workbook
+            wb = load_workbook(self.path, read_only=True)
+            rows = max(wb.active.max_row - 1, 0)
+            wb.close()
+            self._rows_cache = (signature, rows)
+        return self._rows_cache[1]
+
+    def _journal_lines(self, path):
+        """عدد الإضافات في السجل (أسطر التعديل لا تُحسب)"""
+        if not os.path.exists(path):
+            return 0
+        marker = UPDATE_MARKER.encode('utf-8')
+        with open(path, 'rb') as f:
+            return sum(1 for line in f if line.strip() and marker not in line)
+
+    def files(self):
+        return [self.path, self.compacting_path, self.journal_path]
+
+    def count(self):
+        return (self._workbook_rows() + self._journal_lines(self.compacting_path)
+                + self._journal_lines(self.journal_path))
+
+    def compact(self):
+        """طي السجل في ملف Excel، ويرجع عدد السجلات المطوية
+
+        عامل واحد فقط يطوي في كل مرة، والبقية يتجاوزون دون انتظار. الإضافات
+        لا تتوقف أثناء الطي لأنها تذهب إلى سجل جديد.
+        """
+        with file_lock(self.path + '.compact', blocking=False) as acquired:
+            if not acquired:
+                return 0
+            with file_lock(self.path):
+                if not os.path.exists(self.compacting_path):
+                    if not os.path.exists(self.journal_path) or os.path.getsize(self.journal_path) == 0:
+                        return 0
+                    os.replace(self.journal_path, self.compacting_path)
+            self.pending = 0
+            tail = self._read_journal(self.compacting_path)
+            records = self._read_workbook()
+            # المفتاح يمنع التكرار إذا توقف الطي بعد كتابة الملف وقبل حذف السجل
+            folded = self._merge(records, tail)
+            with temporary_sibling(self.path) as tmp_path:
+                self._write_workbook(records, tmp_path)
+                fsync_file(tmp_path)
+                # الاستبدال وحذف السجل المطوي معاً تحت القفل حتى يبقى الترقيم صحيحاً
+                with file_lock(self.path):
+                    os.replace(tmp_path, self.path)
+                    os.remove(self.compacting_path)
+            return folded
+
+
+class Compactor(threading.Thread):
+    """خيط خلفي يطوي السجلات في ملفات Excel كل فترة أو عند امتلاء الدفعة"""
+
+    def __init__(self, workbooks, interval=30, batch_size=200):
+        super().__init__(daemon=True, name='workbook-compactor')
+        self.workbooks = workbooks
+        self.interval = interval
+        self.batch_size = batch_size
+        self._wakeup = threading.Event()
+
+    def notify(self, workbook):
+        """يُستدعى بعد كل إضافة، يوقظ الخيط إذا اكتملت دفعة"""
+        if workbook.pending >= self.batch_size:
+            self._wakeup.set()
+
+    def run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            for workbook in self.workbooks:
+                try:
+                    workbook.compact()
+                except Exception as e:
+                    print(f"Error compacting {workbook.path}: {str(e)}")
+
+
+class ExcelStudentStore(StudentStore):
+    """ملف Excel كمرجع للبيانات، مع سجل إضافات يطويه Compactor"""
+
+    def __init__(self, path):
+        self.workbook = JournaledWorkbook(path, STUDENT_COLUMNS, key='معرف فريد',
+                                          number_column='رقم التسجيل')
+        self.workbook.ensure_exists()
+
+    def files(self):
+        return self.workbook.files()
+
+    def add(self, record):
+        return self.workbook.append(record)
+
+    def add_many(self, records):
+        return self.workbook.append_many(records)
+
+    def set_status(self, student_id, status):
+        if self.get(student_id) is None:
+            return False
+        self.workbook.update(student_id, {'الحالة': status})
+        return True
+
+    def get(self, student_id):
+        for record in self.workbook.records():
+            if record['معرف فريد'] == student_id:
+                return record
+        return None
+
+    def all(self):
+        return self.workbook.records()
+
+
+# ==================== In-Memory Cache ====================
+
+def files_signature(paths):
+    """(mtime, size) لكل ملف، يتغير مع أي كتابة من أي عملية"""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+def normalize_email(email):
+    """توحيد الإيميل (مسافات وحروف كبيرة)، أو None إذا كان فارغاً أو غير صالح"""
+    if email is None:
+        return None
+    email = str(email).strip().lower()
+    return email if EMAIL_PATTERN.match(email) else None
+
+
+def normalize_phone(phone):
+    """أرقام الهاتف فقط، مع تحويل +213 و00213 إلى 0 (0555123456)"""
+    digits = re.sub(r'\D', '', str(phone or ''))
+    for prefix in ('00213', '213'):
+        if digits.startswith(prefix) and len(digits) == len(prefix) + 9:
+            return '0' + digits[len(prefix):]
+    return digits or None
+
+
+def identity_keys(record):
+    """مفاتيح كشف التسجيل المكرر: البرنامج والاسم مع الإيميل أو الهاتف
+
+    الاسم جزء من المفتاح لأن الإخوة في برنامج الأطفال يسجلون غالباً بهاتف
+    وإيميل الولي نفسه.
+    """
+    program = record.get('البرنامج المختار')
+    name = ' '.join(tokenize(record.get('الاسم')))
+    keys = []
+    email = normalize_email(record.get('البريد الإلكتروني'))
+    if email:
+        keys.append((program, name, 'email', email))
+    phone = normalize_phone(record.get('رقم الهاتف'))
+    if phone:
+        keys.append((program, name, 'phone', phone))
+    return keys
+
+
+def _unique_emails(emails):
+    return list(dict.fromkeys(e for e in map(normalize_email, emails) if e))
+
+
+class EmailIndex:
+    """فهرس الإيميلات الموحدة حسب (البرنامج، الحالة)
+
+    لكل مفتاح قاموس {إيميل: عدد الطلاب} يحفظ ترتيب أول ظهور، فيُحذف الإيميل
+    فقط عندما لا يبقى طالب يحمله. '*' تعني كل البرامج أو كل الحالات.
+    """
+
+    def __init__(self):
+        self._lists = {}
+
+    def _keys(self, record):
+        program, status = record.get('البرنامج المختار'), record.get('الحالة')
+        return [(program, status), (program, '*'), ('*', status), ('*', '*')]
+
+    def add(self, record, delta=1):
+        email = normalize_email(record.get('البريد الإلكتروني'))
+        if email is None:
+            return
+        for key in self._keys(record):
+            emails = self._lists.setdefault(key, {})
+            count = emails.get(email, 0) + delta
+            if count > 0:
+                emails[email] = count
+            else:
+                emails.pop(email, None)
+
+    def remove(self, record):
+        self.add(record, -1)
+
+    def get(self, program='*', status='*'):
+        return list(self._lists.get((program, status), {}))
+
+
+def _sort_value(value):
+    """مفتاح ترتيب يضع القيم الفارغة في الأخير ولا يخلط الأرقام بالنصوص"""
+    if value is None:
+        return (2, '')
+    if isinstance(value, (int, float)):
+        return (0, value)
+    try:
+        return (0, float(value))
+    except (TypeError, ValueError):
+        return (1, str(value))
+
+
+class StudentCache(StudentStore):
+    """نسخة من جدول الطلاب في ذاكرة العملية مع فهارس
+
+    فهرس hash على المعرف الفريد وفهارس ثانوية على البرنامج والحالة والولاية،
+    والإحصائيات محسوبة مسبقاً في StudentAggregates. لا يُنظر في المحرك إلا
+    إذا تغير توقيع ملفاته: إن كان له تسلسل تغييرات (SQLite) تُقرأ الصفوف
+    المتغيرة وحدها، وإلا يُعاد التحميل كله.
+    """
+
+    # الفهارس الثانوية: اسم الفهرس -> العمود
+    INDEXES = {
+        'program': 'البرنامج المختار',
+        'status': 'الحالة',
+        'state': 'الولاية',
+    }
+
+    # الأعمدة المفهرسة للبحث النصي
+    SEARCH_FIELDS = ['معرف فريد', 'الاسم', 'اللقب', 'رقم الهاتف', 'البريد الإلكتروني', 'الولاية']
+
+    # مفاتيح الترتيب المتاحة في query()
+    SORT_KEYS = {
+        'reg': lambda r: _sort_value(r.get('رقم التسجيل')),
+        'name': lambda r: (_sort_value(r.get('الاسم')), _sort_value(r.get('اللقب'))),
+        'age': lambda r: _sort_value(r.get('العمر')),
+        'program': lambda r: _sort_value(r.get('البرنامج المختار')),
+        'state': lambda r: _sort_value(r.get('الولاية')),
+        'date': lambda r: _sort_value(str(r.get('تاريخ التسجيل') or '')),
+        'status': lambda r: _sort_value(r.get('الحالة')),
+    }
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.RLock()
+        self._signature = None
+        # رقم آخر تغيير محمّل، None إذا كان المحرك بلا تسلسل تغييرات
+        self._seq = None
+        self._by_id = {}
+        self._indexes = {name: {} for name in self.INDEXES}
+        # ترتيبات محسوبة لكل مفتاح، تُمسح مع أي تغيير في البيانات
+        self._sorted = {}
+        self.aggregates = StudentAggregates(ACTIVE_STATUS)
+        self.email_index = EmailIndex()
+        self.search_index = SearchIndex(self.SEARCH_FIELDS)
+        # identity_keys -> معرف أول طالب يحملها
+        self.identities = {}
+
+    def files(self):
+        return self.store.files()
+
+    def reopen(self):
+        self.store.reopen()
+
+    def iter_filtered(self, **filters):
+        return self.store.iter_filtered(**filters)
+
+    def _index(self, record):
+        self._sorted = {}
+        self._by_id[record['معرف فريد']] = record
+        for name, column in self.INDEXES.items():
+            self._indexes[name].setdefault(record.get(column), {})[record['معرف فريد']] = record
+        self.aggregates.add(record)
+        self.email_index.add(record)
+        self.search_index.add(record['معرف فريد'], record)
+        for key in identity_keys(record):
+            self.identities.setdefault(key, record['معرف فريد'])
+
+    def _unindex(self, record):
+        self._sorted = {}
+        for name, column in self.INDEXES.items():
+            bucket = self._indexes[name].get(record.get(column), {})
+            bucket.pop(record['معرف فريد'], None)
+            if not bucket:
+                self._indexes[name].pop(record.get(column), None)
+        self.aggregates.remove(record)
+        self.email_index.remove(record)
+        self.search_index.remove(record['معرف فريد'])
+        for key in identity_keys(record):
+            if self.identities.get(key) == record['معرف فريد']:
+                del self.identities[key]
+
+    def _reload(self, signature):
+        """بناء الفهارس في نسخة جديدة ثم استبدالها دفعة واحدة
+
+        القراءات بلا قفل، فلا تُفرَّغ الفهارس الحالية أثناء البناء، كما في
+        RecordSearch.refresh.
+        """
+        fresh = type(self)(self.store)
+        with metrics.span('student_cache_reload'):
+            # قبل all(): ما يُكتب بينهما يُقرأ مرة ثانية عند اللحاق ولا يضيع
+            seq = self.store.last_change()
+            for record in self.store.all():
+                fresh._index(record)
+        (self._by_id, self._indexes, self._sorted, self.aggregates, self.email_index,
+         self.search_index, self.identities, self._seq, self._signature) = (
+            fresh._by_id, fresh._indexes, {}, fresh.aggregates, fresh.email_index,
+            fresh.search_index, fresh.identities, seq, signature)
+
+    def _catch_up(self, signature):
+        """تطبيق الصفوف المضافة أو المعدلة منذ آخر تحميل على الفهارس"""
+        with metrics.span('student_cache_catch_up'):
+            changes, seq = self.store.changes_since(self._seq)
+            for record in changes:
+                old = self._by_id.get(record['معرف فريد'])
+                if old is not None:
+                    self._unindex(old)
+                self._index(record)
+        self._seq, self._signature = seq, signature
+
+    def refresh(self):
+        """إعادة التحميل إذا تغيرت الملفات منذ آخر مرة"""
+        signature = files_signature(self.store.files())
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    if self._signature is None or self._seq is None:
+                        self._reload(signature)
+                    else:
+                        self._catch_up(signature)
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+
+    def _write(self, write, apply):
+        """تنفيذ كتابة على المحرك ثم تحديث الفهارس في مكانها إن أمكن
+
+        مع تسلسل التغييرات يكفي اللحاق بعد الكتابة، فهو يقرأ كتابتنا وكتابات
+        العمال الآخرين معاً. وبدونه الكتابة وقراءة البصمة قبلها وبعدها تحت
+        قفل بين العمال (بعد إعادة التحميل لا أثناءها)، فلا تدخل كتابة عامل
+        آخر بينها وتُحسب كأنها لنا.
+        """
+        with self._lock:
+            self.refresh()
+            if self._seq is not None:
+                with metrics.span('student_write'):
+                    result = write()
+                self._catch_up(files_signature(self.store.files()))
+                return result
+            with file_lock(self.store.files()[0] + '.writers'):
+                before = files_signature(self.store.files())
+                with metrics.span('student_write'):
+                    result = write()
+                after = files_signature(self.store.files())
+            if before == self._signature:
+                # لا أحد كتب بين آخر تحميل وكتابتنا: يكفي تحديث الفهارس
+                apply(result)
+                self._signature = after
+            else:
+                self._signature = None
+        return result
+
+    def add_many(self, records):
+        def apply(added):
+            for record in added:
+                self._index(record)
+        return self._write(lambda: self.store.add_many(records), apply)
+
+    def add(self, record):
+        return self.add_many([record])[0]
+
+    def find_duplicate(self, record):
+        """الطالب المسجل مسبقاً بنفس الاسم والإيميل أو الهاتف في نفس البرنامج"""
+        self.refresh()
+        for key in identity_keys(record):
+            student_id = self.identities.get(key)
+            if student_id is not None:
+                return self._by_id.get(student_id)
+        return None
+
+    def add_unique(self, record):
+        """(السجل، True) بعد الإضافة، أو (السجل الموجود، False) إذا كان مكرراً
+
+        الفحص والإضافة تحت قفل العملية فقط: قفل بين العمال يجعل كل عامل يعيد
+        تحميل النسخة بعد كتابة الآخر. الإرسال المزدوج المتزامن لعاملين يمنعه
+        مفتاح Idempotency-Key.
+        """
+        with self._lock:
+            existing = self.find_duplicate(record)
+            if existing is not None:
+                return existing, False
+            return self.add(record), True
+
+    def set_status(self, student_id, status):
+        def apply(updated):
+            if updated:
+                old = self._by_id[student_id]
+                self._unindex(old)
+                self._index(dict(old, **{'الحالة': status}))
+        return self._write(lambda: self.store.set_status(student_id, status), apply)
+
+    def get(self, student_id):
+        self.refresh()
+        return self._by_id.get(student_id)
+
+    def all(self):
+        self.refresh()
+        return list(self._by_id.values())
+
+    def count(self):
+        self.refresh()
+        return len(self._by_id)
+
+    def by_index(self, name, value):
+        self.refresh()
+        return list(self._indexes[name].get(value, {}).values())
+
+    def by_program(self, program):
+        return self.by_index('program', program)
+
+    def by_status(self, status):
+        return self.by_index('status', status)
+
+    def emails(self, program=None, status=None):
+        """الإيميلات الموحدة بلا تكرار من فهرس الإيميلات"""
+        self.refresh()
+        return self.email_index.get(program or '*', status or '*')
+
+    def search(self, query, limit=None):
+        """معرفات الطلاب المطابقين لنص البحث، الأقرب أولاً"""
+        self.refresh()
+        with self._lock:
+            return self.search_index.search(query, limit)
+
+    def _sorted_records(self, sort):
+        """جميع السجلات مرتبة حسب المفتاح، محفوظة حتى التغيير التالي"""
+        order = self._sorted.get(sort)
+        if order is None:
+            order = sorted(self._by_id.values(), key=self.SORT_KEYS[sort])
+            self._sorted[sort] = order
+        return order
+
+    def query(self, filters=None, sort='reg', descending=False, offset=0, limit=50,
+              predicate=None):
+        """صفحة من الطلاب بعد التصفية والترتيب: (العدد الكلي، السجلات)
+
+        filters قاموس {اسم الفهرس: القيمة} يُجاب من الفهارس الثانوية بالبدء
+        بأصغرها، وpredicate شرط إضافي اختياري على كل سجل.
+        """
+        self.refresh()
+        with self._lock:
+            filters = {name: value for name, value in (filters or {}).items()
+                       if value not in (None, '')}
+            if filters:
+                buckets = sorted((self._indexes[name].get(value, {})
+                                  for name, value in filters.items()), key=len)
+                candidates = [r for r in buckets[0].values()
+                              if all(r['معرف فريد'] in bucket for bucket in buckets[1:])]
+                # ترتيب الفهارس ترتيب الإضافة إليها، وset_status تعيد إضافة السجل في آخرها
+                candidates.sort(key=self.SORT_KEYS[sort])
+            elif sort == 'reg':
+                candidates = list(self._by_id.values())
+            else:
+                candidates = self._sorted_records(sort)
+        if predicate is not None:
+            candidates = [r for r in candidates if predicate(r)]
+        if descending:
+            candidates = candidates[::-1]
+        return len(candidates), candidates[offset:offset + limit]
+
+    def summary(self, recent_days=7):
+        self.refresh()
+        return self.aggregates.summary(recent_days)
+
+    def statistics(self):
+        """العدادات المحسوبة مسبقاً بعد التأكد من حداثتها"""
+        self.refresh()
+        return self.aggregates
+
+
+STORAGE_BACKENDS = {
+    'sqlite': SQLiteStudentStore,
+    'excel': ExcelStudentStore,
+}
+
+
+def create_store(backend, **options):
+    """إنشاء محرك التخزين المطلوب بالاسم"""
+    try:
+        store_class = STORAGE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f'محرك تخزين غير معروف: {backend}')
+    return store_class(**options)
+
+
+# ==================== Excel Import/Export ====================
+
+def read_students_excel(path):
+    """قراءة ملف Excel للطلاب كقائمة سجلات"""
+    import pandas as pd
+    with metrics.span('workbook_read', file=os.path.basename(path)):
+        df = pd.read_excel(path, engine='openpyxl')
+    df = df.astype(object).where(df.notna(), None)
+    records = df.to_dict('records')
+    for record in records:
+        for label in STUDENT_COLUMNS:
+            record.setdefault(label, None)
+    return records
+
+
+def import_students_excel(store, path):
+    """استيراد ملف Excel إلى المحرك، يُستعمل عند الترحيل لأول مرة
+
+    أرقام التسجيل يعيد المحرك إسنادها بترتيب الملف، فالأرقام المكررة في
+    الملف لا توقف التشغيل. الصفوف بلا معرف أو بمعرف تكرر تُترك ويُبلّغ عنها.
+    """
+    if not os.path.exists(path):
+        return 0
+    records, seen, skipped = [], set(), []
+    for row, record in enumerate(read_students_excel(path), start=2):
+        student_id = record.get('معرف فريد')
+        if student_id is None or student_id in seen:
+            skipped.append((row, student_id))
+            continue
+        seen.add(student_id)
+        records.append(dict(record, **{'رقم التسجيل': None}))
+    for row, student_id in skipped:
+        print(f"Skipped student row {row} in {path}: "
+              f"{'missing' if student_id is None else 'duplicate'} ID {student_id or ''}".rstrip())
+    store.add_many(records)
+    return len(records)
+
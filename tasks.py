@@ -0,0 +1,205 @@
+"""طابور مهام محلي للأعمال البطيئة خارج مسار الطلب
+
+المهام تُحفظ في ملف SQLite فتبقى بعد إعادة التشغيل، وتنفذها خيوط عمل داخل
+العملية. عدة عمال gunicorn يتشاركون نفس الملف، وكل مهمة يأخذها عامل واحد.
+المهمة التي توقف عاملها في منتصفها تعود إلى الطابور بعد انتهاء مهلتها.
+"""
+import json
+import sqlite3
+import threading
+import time
+import traceback
+
+
+class TaskQueue:
+    """طابور مهام دائم على القرص مع خيوط عمل في العملية"""
+
+    def __init__(self, path, workers=2, poll_interval=2.0, lease_seconds=300,
+                 max_attempts=3, keep_done_seconds=24 * 3600):
+        self.path = path
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.keep_done_seconds = keep_done_seconds
+        self.handlers = {}
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._schema_ready = False
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            if not self._schema_ready:
+                # الجداول تُنشأ عند أول اتصال لا عند الإنشاء، فيبقى استيراد التطبيق سريعاً
+                self._init_schema(conn)
+                self._schema_ready = True
+        return conn
+
+    def reopen(self):
+        """ترك اتصالات العملية الأم بعد fork"""
+        self._local = threading.local()
+
+    def _init_schema(self, conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                done INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                message TEXT,
+                run_after REAL NOT NULL,
+                locked_at REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )''')
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_tasks_pending ON tasks(status, run_after)')
+
+    def handler(self, name):
+        """Decorator لتسجيل دالة تنفذ المهام من نوع name"""
+        def decorator(f):
+            self.handlers[name] = f
+            return f
+        return decorator
+
+    def enqueue(self, name, **payload):
+        """إضافة مهمة وإرجاع معرفها، دون انتظار تنفيذها"""
+        now = time.time()
+        cur = self._connect().execute(
+            'INSERT INTO tasks (name, payload, run_after, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (name, json.dumps(payload, ensure_ascii=False), now, now, now))
+        self._wakeup.set()
+        return cur.lastrowid
+
+    def get(self, task_id):
+        row = self._connect().execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def recent(self, name=None, limit=20):
+        if name is None:
+            rows = self._connect().execute(
+                'SELECT * FROM tasks ORDER BY id DESC LIMIT ?', (limit,))
+        else:
+            rows = self._connect().execute(
+                'SELECT * FROM tasks WHERE name = ? ORDER BY id DESC LIMIT ?', (name, limit))
+        return [self._to_dict(row) for row in rows]
+
+    def newer(self, task_id, name):
+        """حمولات المهام من نفس النوع التي أضيفت بعد task_id"""
+        rows = self._connect().execute(
+            'SELECT payload FROM tasks WHERE name = ? AND id > ?', (name, task_id))
+        return [json.loads(row[0]) for row in rows]
+
+    def pending_count(self):
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM tasks WHERE status IN ('pending', 'running')").fetchone()[0]
+
+    @staticmethod
+    def _to_dict(row):
+        task = dict(row)
+        task['payload'] = json.loads(task['payload'])
+        return task
+
+    def progress(self, task_id, done, total=None):
+        """تحديث تقدم المهمة، يُستدعى من داخل الدالة المنفذة"""
+        if total is None:
+            self._connect().execute(
+                'UPDATE tasks SET done = ?, updated_at = ? WHERE id = ?',
+                (done, time.time(), task_id))
+        else:
+            self._connect().execute(
+                'UPDATE tasks SET done = ?, total = ?, updated_at = ? WHERE id = ?',
+                (done, total, time.time(), task_id))
+
+    def _claim(self):
+        """أخذ أقدم مهمة جاهزة، أو مهمة انتهت مهلة عاملها"""
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                "SELECT * FROM tasks WHERE (status = 'pending' AND run_after <= ?) "
+                "OR (status = 'running' AND locked_at < ?) ORDER BY id LIMIT 1",
+                (now, now - self.lease_seconds)).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE tasks SET status = 'running', attempts = attempts + 1, "
+                    "locked_at = ?, updated_at = ? WHERE id = ?", (now, now, row['id']))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return self._to_dict(row) if row else None
+
+    def _finish(self, task, status, message=None, retry_after=None):
+        now = time.time()
+        if retry_after is not None:
+            self._connect().execute(
+                "UPDATE tasks SET status = 'pending', run_after = ?, locked_at = NULL, "
+                "message = ?, updated_at = ? WHERE id = ?",
+                (now + retry_after, message, now, task['id']))
+        else:
+            self._connect().execute(
+                'UPDATE tasks SET status = ?, locked_at = NULL, message = ?, updated_at = ? '
+                'WHERE id = ?', (status, message, now, task['id']))
+
+    def run_one(self):
+        """تنفيذ مهمة واحدة إن وُجدت، ويرجع True إذا نُفذت مهمة"""
+        task = self._claim()
+        if task is None:
+            return False
+        handler = self.handlers.get(task['name'])
+        if handler is None:
+            self._finish(task, 'failed', f"لا توجد دالة للمهمة {task['name']}")
+            return True
+        try:
+            handler(task['id'], **task['payload'])
+            self._finish(task, 'done')
+        except Exception as e:
+            print(f"Error in task {task['name']} #{task['id']}: {str(e)}")
+            traceback.print_exc()
+            if task['attempts'] + 1 < self.max_attempts:
+                # تأخير متزايد قبل المحاولة التالية
+                self._finish(task, 'pending', str(e), retry_after=2 ** (task['attempts'] + 1))
+            else:
+                self._finish(task, 'failed', str(e))
+        return True
+
+    def purge(self):
+        """حذف المهام المنتهية القديمة"""
+        self._connect().execute(
+            "DELETE FROM tasks WHERE status IN ('done', 'failed') AND updated_at < ?",
+            (time.time() - self.keep_done_seconds,))
+
+    def _worker(self):
+        last_purge = 0
+        while True:
+            try:
+                if self.run_one():
+                    continue
+                if time.time() - last_purge > 3600:
+                    self.purge()
+                    last_purge = time.time()
+            except Exception as e:
+                print(f"Error in task worker: {str(e)}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        """تشغيل خيوط العمل، مرة واحدة لكل عملية"""
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, daemon=True, name=f'task-worker-{i}')
+            thread.start()
+            self._threads.append(thread)